@@ -1,3 +1,12 @@
-from agent.graph import graph
-
 __all__ = ["graph"]
+
+
+def __getattr__(name: str):
+    """Resolve `agent.graph` lazily so importing the package does not compile it."""
+    if name == "graph":
+        from agent.graph import get_graph
+
+        # Importing the submodule binds it as `agent.graph`; rebind to the graph
+        globals()["graph"] = graph = get_graph()
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
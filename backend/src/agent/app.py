@@ -1,10 +1,38 @@
 # mypy: disable - error - code = "no-untyped-def,misc"
+import asyncio
+import contextlib
+import logging
+import os
 import pathlib
 from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
 
+from agent.internal.retrieve import (
+    close_embedding_batcher,
+    close_http_session,
+    close_triton_clients,
+    warmup,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up the embedding client on startup and stop the batcher and pooled connections on shutdown.
+
+    Set AGENT_SKIP_WARMUP=1 to skip the warmup, e.g. in tests.
+    """
+    if os.getenv("AGENT_SKIP_WARMUP", "").lower() not in ("1", "true", "yes"):
+        await asyncio.to_thread(warmup)
+    yield
+    await close_embedding_batcher()
+    await close_http_session()
+    close_triton_clients()
+
+
 # Define the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 def create_frontend_router(build_dir="../frontend/dist"):
@@ -19,8 +47,9 @@ def create_frontend_router(build_dir="../frontend/dist"):
     build_path = pathlib.Path(__file__).parent.parent.parent / build_dir
 
     if not build_path.is_dir() or not (build_path / "index.html").is_file():
-        print(
-            f"WARN: Frontend build directory not found or incomplete at {build_path}. Serving frontend will likely fail."
+        logger.warning(
+            "Frontend build directory not found or incomplete at %s. Serving frontend will likely fail.",
+            build_path,
         )
         # Return a dummy router if build isn't ready
         from starlette.routing import Route
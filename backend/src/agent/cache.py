@@ -0,0 +1,197 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """In-process cache that returns values stored for semantically similar texts.
+
+    Entries are keyed by L2-normalized embeddings and matched by cosine similarity.
+    They expire after `ttl` seconds and the least recently used entry is evicted once
+    `maxsize` entries are stored.
+    """
+
+    def __init__(self, ttl: float = 3600.0, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, tuple[np.ndarray, Any, float]] = OrderedDict()
+        self._next_id = 0
+        # Stacked embeddings of the current entries, rebuilt lazily after changes
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, embedding: np.ndarray, threshold: float) -> Optional[Any]:
+        """Return the value of the most similar entry if its similarity reaches `threshold`."""
+        self._evict_expired()
+        if not self._entries:
+            return None
+
+        if self._matrix is None:
+            self._ids = list(self._entries)
+            self._matrix = np.stack([entry[0] for entry in self._entries.values()])
+
+        scores = self._matrix @ _normalize(embedding)
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+
+        entry_id = self._ids[best]
+        self._entries.move_to_end(entry_id)
+        return self._entries[entry_id][1]
+
+    def store(self, embedding: np.ndarray, value: Any) -> None:
+        """Store `value` under `embedding`, evicting the least recently used entry if full."""
+        self._entries[self._next_id] = (
+            _normalize(embedding),
+            value,
+            time.monotonic() + self.ttl,
+        )
+        self._next_id += 1
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+        self._matrix = None
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry[2] <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+
+class HotQueryCache:
+    """In-process LRU cache that only keeps results for frequently seen keys.
+
+    `get` counts every lookup of a key. A result passed to `put` is only stored once
+    its key has been looked up at least `hot_threshold` times, so one-off queries do
+    not evict the hot ones. Stored results expire after `ttl` seconds.
+    """
+
+    def __init__(self, hot_threshold: int = 3, maxsize: int = 512, ttl: float = 3600.0):
+        self.hot_threshold = hot_threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._counts: OrderedDict[Hashable, int] = OrderedDict()
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Record a lookup of `key` and return its stored result, if any."""
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._counts.move_to_end(key)
+        while len(self._counts) > self.maxsize:
+            self._counts.popitem(last=False)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store `value` under `key` if the key is hot."""
+        if self._counts.get(key, 0) < self.hot_threshold:
+            return
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries and lookup counts."""
+        self._counts.clear()
+        self._entries.clear()
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a query for exact-match caching: case-folded, whitespace collapsed."""
+    return " ".join(text.casefold().split())
+
+
+def detect_script(text: str) -> str:
+    """Return a coarse language key for `text`: the script most of its letters are written in."""
+    counts = {"ko": 0, "ja": 0, "zh": 0, "latin": 0}
+    for char in text:
+        code = ord(char)
+        if 0xAC00 <= code <= 0xD7A3 or 0x3130 <= code <= 0x318F:
+            counts["ko"] += 1
+        elif 0x3040 <= code <= 0x30FF:
+            counts["ja"] += 1
+        elif 0x4E00 <= code <= 0x9FFF:
+            counts["zh"] += 1
+        elif char.isascii() and char.isalpha():
+            counts["latin"] += 1
+    # Kana marks Japanese even when most of the letters are kanji
+    if counts["ja"]:
+        return "ja"
+    script, count = max(counts.items(), key=lambda item: item[1])
+    return script if count else "other"
+
+
+def _normalize(embedding: Any) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+async def embed_text(text: str) -> Optional[np.ndarray]:
+    """Embed `text` for a semantic cache lookup, or return None if embedding fails.
+
+    Caches are an optimization only, so an unavailable embedding service must not
+    fail the calling node.
+    """
+    # Import here to avoid circular imports
+    from agent.internal.retrieve import generate_embeddings
+
+    try:
+        embeddings, _ = await generate_embeddings([text])
+    except Exception:
+        logger.warning("Semantic cache embedding failed", exc_info=True)
+        return None
+    return np.asarray(embeddings[0], dtype=np.float32)
+
+
+async def cached_acall(
+    cache: SemanticCache,
+    key_text: str,
+    threshold: float,
+    compute: Callable[[], Awaitable[Any]],
+) -> Any:
+    """Await `compute()` unless a result for a similar `key_text` is cached.
+
+    Args:
+        cache: Cache holding results of earlier calls
+        key_text: Text whose embedding identifies the request
+        threshold: Minimum cosine similarity for a cached result to be reused
+        compute: Coroutine function producing the result on a cache miss
+
+    Returns:
+        The cached or freshly computed result
+    """
+    embedding = await embed_text(key_text)
+    if embedding is not None:
+        cached = cache.lookup(embedding, threshold)
+        if cached is not None:
+            return cached
+
+    result = await compute()
+    if embedding is not None and result is not None:
+        cache.store(embedding, result)
+    return result
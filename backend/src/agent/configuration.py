@@ -1,28 +1,30 @@
+import functools
 import os
-from pydantic import BaseModel, Field
-from typing import Any, Optional, Literal
+from dataclasses import dataclass, field, fields
+from typing import Any, Literal, Optional, get_args, get_origin
 
 from langchain_core.runnables import RunnableConfig
 
 
-class Configuration(BaseModel):
+@dataclass(frozen=True, slots=True)
+class Configuration:
     """The configuration for the agent."""
 
-    query_generator_model: str = Field(
+    query_generator_model: str = field(
         default="gemini-2.0-flash",
         metadata={
             "description": "The name of the language model to use for the agent's query generation."
         },
     )
 
-    reflection_model: str = Field(
+    reflection_model: str = field(
         default="gemini-2.5-flash",
         metadata={
             "description": "The name of the language model to use for the agent's reflection."
         },
     )
 
-    answer_model: str = Field(
+    answer_model: str = field(
         # default="gemini-2.5-pro",
         default="gemini-2.5-flash",
         metadata={
@@ -30,53 +32,243 @@ class Configuration(BaseModel):
         },
     )
 
-    number_of_initial_queries: int = Field(
+    number_of_initial_queries: int = field(
         default=3,
         metadata={"description": "The number of initial search queries to generate."},
     )
 
-    max_research_loops: int = Field(
+    max_research_loops: int = field(
         default=2,
         metadata={"description": "The maximum number of research loops to perform."},
     )
 
-    max_intent_clarify_attempts: int = Field(
+    max_summary_chars: int = field(
+        default=48000,
+        metadata={
+            "description": "The maximum length of the research summaries passed to the reflection and answer prompts; longer summaries are shortened. 0 disables the limit."
+        },
+    )
+
+    max_intent_clarify_attempts: int = field(
         default=2,
         metadata={
             "description": "The maximum number of intent clarification attempts before forcing to proceed."
         },
     )
 
-    force_search_mode: Literal["auto", "web", "knowledge"] = Field(
+    force_search_mode: Literal["auto", "web", "knowledge"] = field(
         default="auto",
         metadata={
             "description": "Force search mode configuration. 'auto' follows normal classification logic, 'web' forces web search, 'knowledge' forces knowledge search."
         },
     )
 
-    enable_intent_clarify: bool = Field(
+    enable_intent_clarify: bool = field(
         default=True,
         metadata={
             "description": "Whether to enable intent clarification functionality. If True, unclear queries will be clarified. If False, will proceed directly to the next step."
         },
     )
 
+    enable_intent_heuristics: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether intent_clarify decides obviously clear or obviously too short inputs without an LLM call."
+        },
+    )
+
+    max_concurrent_web_searches: int = field(
+        default=4,
+        metadata={
+            "description": "The maximum number of web searches running at once per process; further searches wait."
+        },
+    )
+
+    max_concurrent_knowledge_searches: int = field(
+        default=8,
+        metadata={
+            "description": "The maximum number of knowledge searches running at once per process; further searches wait."
+        },
+    )
+
+    max_concurrent_llm_calls: int = field(
+        default=16,
+        metadata={
+            "description": "The maximum number of non-streaming LLM calls running at once per process; further calls wait. Read from the environment only."
+        },
+    )
+
+    speculative_query_generation: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether intent_clarify generates the initial search queries concurrently with its clarity check, discarding them if clarification is needed."
+        },
+    )
+
+    parallel_guardrail_checks: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether to run one concurrent guardrail check per violation category instead of a single combined check."
+        },
+    )
+
+    enable_draft_answer: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to answer with the reflection's draft when the first research loop is sufficient, skipping finalize_answer. The draft is written by reflection_model under the reflection prompt, not by answer_model, and is not streamed."
+        },
+    )
+
+    guardrail_trusted_turns: int = field(
+        default=0,
+        metadata={
+            "description": "The number of consecutive safe turns after which input_guardrail skips the LLM check for inputs without trigger words. 0 (the default) always checks. Enabling it saves guardrail calls on long conversations, but later turns are then only screened by a keyword pattern, which a multi-turn jailbreak can avoid."
+        },
+    )
+
+    enable_semantic_cache: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether to reuse guardrail, intent clarity, classification and first-turn direct answer results for semantically similar inputs."
+        },
+    )
+
+    enable_answer_cache: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether direct_answer reuses the answer previously generated for an identical prompt and model."
+        },
+    )
+
+    guardrail_cache_threshold: float = field(
+        default=0.98,
+        metadata={
+            "description": "The minimum cosine similarity for reusing a cached guardrail verdict."
+        },
+    )
+
+    classification_cache_threshold: float = field(
+        default=0.95,
+        metadata={
+            "description": "The minimum cosine similarity for reusing a cached query classification."
+        },
+    )
+
+    intent_cache_threshold: float = field(
+        default=0.95,
+        metadata={
+            "description": "The minimum cosine similarity for reusing a cached intent clarity verdict."
+        },
+    )
+
+    direct_answer_cache_threshold: float = field(
+        default=0.95,
+        metadata={
+            "description": "The minimum cosine similarity for reusing the direct answer to a first-turn question asked the same day."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
     ) -> "Configuration":
-        """Create a Configuration instance from a RunnableConfig."""
+        """Create a Configuration instance from a RunnableConfig.
+
+        Instances are memoized on the configurable field values, so routing
+        edges that resolve the configuration on every hop share one object.
+        """
         configurable = (
             config["configurable"] if config and "configurable" in config else {}
         )
+        if not configurable or configurable.keys().isdisjoint(_FIELD_NAMES):
+            # Nothing overridden: reuse the environment-derived defaults
+            return _default_config()
+
+        # Only the declared fields take part in the key: LangGraph also stores
+        # runtime internals in `configurable` that are neither hashable nor stable.
+        configurable_values = tuple(
+            configurable.get(name) for name, _, _ in _FIELD_SPECS
+        )
+        try:
+            return _get_config(configurable_values)
+        except TypeError:
+            # Unhashable override values cannot be cached, build them directly
+            return _get_config.__wrapped__(configurable_values)
+
+
+_TRUE_STRINGS = frozenset({"1", "true", "yes", "on"})
+_FALSE_STRINGS = frozenset({"0", "false", "no", "off", ""})
+
+
+def _parse_bool(value: Any) -> bool:
+    """Parse a boolean flag given as a bool or as an environment-style string."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE_STRINGS:
+        return True
+    if text in _FALSE_STRINGS:
+        return False
+    raise ValueError(f"expected a boolean, got {value!r}")
+
+
+def _literal_parser(choices: tuple[Any, ...]):
+    """Return a coercer accepting only the values of a Literal type."""
+
+    def parse(value: Any) -> Any:
+        if value not in choices:
+            raise ValueError(f"expected one of {choices}, got {value!r}")
+        return value
+
+    return parse
+
+
+def _coercer(field_type: Any):
+    """Return the function converting configured values to `field_type`, if any."""
+    if get_origin(field_type) is Literal:
+        return _literal_parser(get_args(field_type))
+    return {bool: _parse_bool, int: int, float: float}.get(field_type)
+
+
+# (field name, environment variable, coercer) per field, resolved once so that
+# building an instance needs no per-field type dispatch
+_FIELD_SPECS = tuple(
+    (f.name, f.name.upper(), _coercer(f.type)) for f in fields(Configuration)
+)
+_FIELD_NAMES = frozenset(name for name, _, _ in _FIELD_SPECS)
+
+
+@functools.cache
+def _env_values() -> dict[str, str]:
+    """Snapshot the environment overrides for the configuration fields."""
+    return {
+        name: os.environ[env_name]
+        for name, env_name, _ in _FIELD_SPECS
+        if env_name in os.environ
+    }
+
+
+@functools.lru_cache(maxsize=128)
+def _get_config(configurable_values: tuple[Any, ...]) -> Configuration:
+    """Build a Configuration from configurable values, environment taking precedence.
+
+    `configurable_values` holds one value per field, in declaration order.
+    """
+    env_values = _env_values()
+    kwargs = {}
+    for (name, _, coerce), value in zip(_FIELD_SPECS, configurable_values):
+        value = env_values.get(name, value)
+        # Unset fields keep their defaults
+        if value is not None:
+            try:
+                kwargs[name] = value if coerce is None else coerce(value)
+            except ValueError as e:
+                raise ValueError(f"Invalid configuration value for {name}: {e}") from None
 
-        # Get raw values from environment or config
-        raw_values: dict[str, Any] = {
-            name: os.environ.get(name.upper(), configurable.get(name))
-            for name in cls.model_fields.keys()
-        }
+    return Configuration(**kwargs)
 
-        # Filter out None values
-        values = {k: v for k, v in raw_values.items() if v is not None}
 
-        return cls(**values)
+@functools.cache
+def _default_config() -> Configuration:
+    """Return the Configuration used when no field is set in the configurable."""
+    return _get_config((None,) * len(_FIELD_SPECS))
@@ -1,3 +1,7 @@
+import logging
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
 from langgraph.types import Send
 from agent.state import (
     OverallState,
@@ -7,21 +11,24 @@ from agent.state import (
 )
 from agent.configuration import Configuration
 
+logger = logging.getLogger(__name__)
+
 
 def route_after_guardrail(state: OverallState) -> str:
     """LangGraph routing function that determines whether input is safe to proceed.
 
-    Routes based on guardrail validation result - either proceeds to query classification
-    or blocks the request with an error response.
+    Runs once both the guardrail and the query classification have finished. Blocks the
+    request with an error response if the input is unsafe, otherwise routes on the
+    classification result.
 
     Args:
-        state: Current graph state containing the guardrail validation result
+        state: Current graph state containing the guardrail and classification results
 
     Returns:
-        String literal indicating the next node to visit ("classify_query" or "guardrail_block")
+        String literal indicating the next node to visit ("guardrail_block", "intent_clarify" or "direct_answer")
     """
     if state["is_safe_input"]:
-        return "classify_query"
+        return route_after_classification(state)
     else:
         return "guardrail_block"
 
@@ -38,13 +45,40 @@ def route_after_classification(state: QueryClassificationState) -> str:
     Returns:
         String literal indicating the next node to visit ("intent_clarify" or "direct_answer")
     """
-    if state["needs_web_search"] or state["needs_knowledge_search"]:
-        return "intent_clarify"
-    else:
-        return "direct_answer"
+    return _CLASSIFICATION_ROUTES[
+        bool(state["needs_web_search"]), bool(state["needs_knowledge_search"])
+    ]
+
+
+# Route tables keyed by (needs_web_search, needs_knowledge_search)
+_CLASSIFICATION_ROUTES = {
+    (True, True): "intent_clarify",
+    (True, False): "intent_clarify",
+    (False, True): "intent_clarify",
+    (False, False): "direct_answer",
+}
+# Web search takes precedence when both searches are needed
+_SEARCH_ROUTES = {
+    (True, True): "generate_query",
+    (True, False): "generate_query",
+    (False, True): "generate_knowledge_query",
+    (False, False): "direct_answer",
+}
+
+
+def _search_route(state: OverallState) -> str:
+    """Map the query classification to the node that starts the matching search.
 
+    Falls back to "direct_answer" if no search is needed.
+    """
+    return _SEARCH_ROUTES[
+        bool(state.get("needs_web_search")), bool(state.get("needs_knowledge_search"))
+    ]
 
-def route_after_intent_clarify_search(state: OverallState, config) -> str:
+
+def route_after_intent_clarify_search(
+    state: OverallState, config: RunnableConfig
+) -> str:
     """LangGraph routing function that routes to appropriate search type after intent clarification.
 
     Determines whether to proceed with web search, knowledge search, or provide clarification
@@ -57,47 +91,64 @@ def route_after_intent_clarify_search(state: OverallState, config) -> str:
     Returns:
         String literal indicating the next node to visit
     """
-    from agent.configuration import Configuration
-
+    # Memoized and frozen, so this resolves to the same instance on every hop
     configurable = Configuration.from_runnable_config(config)
-    current_count = state.get("intent_clarify_count", 0)
 
     # If intent clarification is disabled, skip clarification and proceed directly
     if not configurable.enable_intent_clarify:
-        print("Intent clarification이 비활성화되어 다음 단계로 진행합니다.")
+        logger.info("Intent clarification이 비활성화되어 다음 단계로 진행합니다.")
         # Proceed based on configuration or original classification
-        if state.get("needs_web_search"):
-            return "generate_query"
-        elif state.get("needs_knowledge_search"):
-            return "generate_knowledge_query"
-        else:
-            return "direct_answer"
+        return _search_route(state)
+
+    current_count = state.get("intent_clarify_count", 0)
 
     # If we've reached the maximum clarification attempts, force proceed with search or direct answer
     if current_count >= configurable.max_intent_clarify_attempts:
-        print(
-            f"Intent clarification 최대 횟수 도달 ({current_count}번), 검색으로 진행합니다."
+        logger.info(
+            "Intent clarification 최대 횟수 도달 (%d번), 검색으로 진행합니다.", current_count
         )
         # Force proceed based on original classification
-        if state.get("needs_web_search"):
-            return "generate_query"
-        elif state.get("needs_knowledge_search"):
-            return "generate_knowledge_query"
-        else:
-            return "direct_answer"
+        return _search_route(state)
 
     # Normal flow - check if clarification is needed
     if state["needs_clarification"]:
         return "provide_clarification"
 
     # Check the original classification to determine search type
-    if state.get("needs_web_search"):
-        return "generate_query"
-    elif state.get("needs_knowledge_search"):
-        return "generate_knowledge_query"
-    else:
-        # Fallback to direct answer if no search is needed
-        return "direct_answer"
+    return _search_route(state)
+
+
+def _send_queries(
+    node: str,
+    queries: list[str],
+    messages: list,
+    start: int = 0,
+    embeddings: Optional[list[list[float]]] = None,
+) -> list[Send]:
+    """Build one Send per search query, numbering them from `start`.
+
+    Every payload shares the same messages, so they are merged from a single
+    template dict instead of rebuilding the full payload per query. Precomputed
+    query embeddings are attached when there is one per query.
+    """
+    template = {"messages": messages}
+    if embeddings and len(embeddings) == len(queries):
+        return [
+            Send(
+                node,
+                {
+                    **template,
+                    "search_query": search_query,
+                    "query_embedding": embedding,
+                    "id": start + idx,
+                },
+            )
+            for idx, (search_query, embedding) in enumerate(zip(queries, embeddings))
+        ]
+    return [
+        Send(node, {**template, "search_query": search_query, "id": start + idx})
+        for idx, search_query in enumerate(queries)
+    ]
 
 
 def continue_to_web_research(state: QueryGenerationState):
@@ -105,112 +156,77 @@ def continue_to_web_research(state: QueryGenerationState):
 
     This is used to spawn n number of web research nodes, one for each search query.
     """
-    return [
-        Send(
-            "web_research",
-            {
-                "search_query": search_query,
-                "id": int(idx),
-                "messages": state["messages"],
-            },
-        )
-        for idx, search_query in enumerate(
-            state["search_query"][-3:]
-        )  # TODO: 추후 state search_query 누적 수정 필요
-    ]
+    return _send_queries(
+        "web_research",
+        state["search_query"][-3:],  # TODO: 추후 state search_query 누적 수정 필요
+        state["messages"],
+    )
 
 
-def continue_to_knowledge_search(state: QueryGenerationState):
+def continue_to_knowledge_search(state: OverallState):
     """LangGraph node that sends the search queries to the knowledge search node.
 
     This is used to spawn n number of knowledge search nodes, one for each search query.
+    The query embeddings computed by `embed_knowledge_queries` travel with each Send.
     """
-    return [
-        Send(
-            "knowledge_search",
-            {
-                "search_query": search_query,
-                "id": int(idx),
-                "messages": state["messages"],
-            },
-        )
-        for idx, search_query in enumerate(
-            state["search_query"][-3:]
-        )  # TODO: 추후 state search_query 누적 수정 필요
-    ]
-
-
-def evaluate_research(
-    state: ReflectionState,
-    config,
-) -> OverallState:
-    """LangGraph routing function that determines the next step in the research flow.
+    return _send_queries(
+        "knowledge_search",
+        state["search_query"][-3:],  # TODO: 추후 state search_query 누적 수정 필요
+        state["messages"],
+        embeddings=state.get("query_embeddings"),
+    )
 
-    Controls the research loop by deciding whether to continue gathering information
-    or to finalize the summary based on the configured maximum number of research loops.
 
-    Args:
-        state: Current graph state containing the research loop count
-        config: Configuration for the runnable, including max_research_loops setting
+def _make_evaluator(search_node: str):
+    """Create the routing function that closes a research loop over `search_node`.
 
-    Returns:
-        String literal indicating the next node to visit ("web_research" or "finalize_summary")
+    The returned function controls the loop by deciding whether to continue gathering
+    information from `search_node` or to finalize the answer, based on the reflection
+    result and the configured maximum number of research loops. When the first loop is
+    sufficient, the reflection's draft answer is used as the final answer.
     """
-    configurable = Configuration.from_runnable_config(config)
-    max_research_loops = (
-        state.get("max_research_loops")
-        if state.get("max_research_loops") is not None
-        else configurable.max_research_loops
-    )
-    if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:
-        return "finalize_answer"
-    else:
-        return [
-            Send(
-                "web_research",
-                {
-                    "search_query": follow_up_query,
-                    "id": state["number_of_ran_queries"] + int(idx),
-                    "messages": state["messages"],
-                },
-            )
-            for idx, follow_up_query in enumerate(state["follow_up_queries"])
-        ]
 
+    def evaluate(
+        state: ReflectionState,
+        config: RunnableConfig,
+    ) -> str | list[Send]:
+        """LangGraph routing function that determines the next step in the research flow.
+
+        Args:
+            state: Current graph state containing the research loop count
+            config: Configuration for the runnable, including max_research_loops setting
+
+        Returns:
+            "emit_draft" or "finalize_answer", or one Send to the search node per follow-up query
+        """
+        configurable = Configuration.from_runnable_config(config)
+        max_research_loops = state.get("max_research_loops")
+        if max_research_loops is None:
+            max_research_loops = configurable.max_research_loops
+        if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:
+            # A first loop judged sufficient already came with its answer
+            if (
+                configurable.enable_draft_answer
+                and state["is_sufficient"]
+                and state["research_loop_count"] == 1
+                and state.get("draft_answer")
+            ):
+                return "emit_draft"
+            return "finalize_answer"
+        return _send_queries(
+            search_node,
+            state["follow_up_queries"],
+            state["messages"],
+            start=state["number_of_ran_queries"],
+        )
 
-def evaluate_knowledge_search(
-    state: ReflectionState,
-    config,
-) -> OverallState:
-    """LangGraph routing function that determines the next step in the knowledge search flow.
+    return evaluate
 
-    Controls the knowledge search loop by deciding whether to continue gathering information
-    or to finalize the summary based on the configured maximum number of research loops.
 
-    Args:
-        state: Current graph state containing the research loop count
-        config: Configuration for the runnable, including max_research_loops setting
+# Routing after reflection: loop back to web research or finalize the answer
+evaluate_research = _make_evaluator("web_research")
+evaluate_research.__name__ = "evaluate_research"
 
-    Returns:
-        String literal indicating the next node to visit ("knowledge_search" or "finalize_answer")
-    """
-    configurable = Configuration.from_runnable_config(config)
-    max_research_loops = (
-        state.get("max_research_loops")
-        if state.get("max_research_loops") is not None
-        else configurable.max_research_loops
-    )
-    if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:
-        return "finalize_answer"
-    else:
-        return [
-            Send(
-                "knowledge_search",
-                {
-                    "search_query": follow_up_query,
-                    "id": state["number_of_ran_queries"] + int(idx),
-                    "messages": state["messages"],
-                },
-            )
-            for idx, follow_up_query in enumerate(state["follow_up_queries"])
-        ]
+# Routing after knowledge reflection: loop back to knowledge search or finalize the answer
+evaluate_knowledge_search = _make_evaluator("knowledge_search")
+evaluate_knowledge_search.__name__ = "evaluate_knowledge_search"
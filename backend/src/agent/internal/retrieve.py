@@ -1,17 +1,27 @@
 from dotenv import load_dotenv
-import functools
+import asyncio
+import concurrent.futures
 import os
-import json
 import logging
+import threading
 import time
+import weakref
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional, Tuple, Union
 
-import requests
 import aiohttp
 import numpy as np
-import tritonclient.grpc as grpcclient
+import orjson
 from pinecone import Pinecone, ServerlessSpec
 
+try:
+    import tritonclient.grpc as grpcclient
+
+    _HAS_TRITON = True
+except ImportError:
+    grpcclient = None
+    _HAS_TRITON = False
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
@@ -23,28 +33,108 @@ VSS_RETRIEVE_URL = os.getenv("VSS_RETRIEVE_URL", "http://192.168.100.40:9123/sea
 PINECONE_NAMESPACE = "retrieval-bench-channel-1"
 SEARCH_TOP_K = 10
 CHANNEL_ID = "1"
+# Set EMBEDDING_FP16=1 to keep embeddings in half precision: half the memory, and
+# shorter float literals in the VSS request body, at a small cost in recall
+EMBEDDING_DTYPE = (
+    np.float16
+    if os.getenv("EMBEDDING_FP16", "").lower() in ("1", "true", "yes")
+    else np.float32
+)
+
+
+# gRPC channel settings for many small embedding requests: keepalive pings keep the
+# connection warm between bursts, and gRPC-level retries are left to the callers
+TRITON_CHANNEL_ARGS = [
+    ("grpc.keepalive_time_ms", 10000),
+    ("grpc.keepalive_timeout_ms", 5000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.max_send_message_length", 64 << 20),
+    ("grpc.max_receive_message_length", 64 << 20),
+    ("grpc.enable_retries", 0),
+]
+
+
+# The sync gRPC client is thread-safe, so one client per URL is shared by all threads
+_triton_clients: Dict[str, Any] = {}
+_triton_clients_lock = threading.Lock()
 
 
-@functools.cache
 def get_triton_client(url: str):
     """Get Triton client with caching"""
-
-    triton_client = grpcclient.InferenceServerClient(url=url, verbose=False)
+    triton_client = _triton_clients.get(url)
+    if triton_client is None:
+        with _triton_clients_lock:
+            triton_client = _triton_clients.get(url)
+            if triton_client is None:
+                triton_client = _triton_clients[url] = grpcclient.InferenceServerClient(
+                    url=url, verbose=False, channel_args=TRITON_CHANNEL_ARGS
+                )
     return triton_client
 
 
+def close_triton_clients() -> None:
+    """Close every cached Triton client"""
+    with _triton_clients_lock:
+        clients = list(_triton_clients.values())
+        _triton_clients.clear()
+    for triton_client in clients:
+        try:
+            triton_client.close()
+        except Exception:
+            logger.warning("Error closing Triton client", exc_info=True)
+
+
+# Triton request objects are refilled for every batch, so each thread keeps its own
+_request_objects = threading.local()
+
+
+def _get_request_objects(input_name: str, output_name: str):
+    """Get the calling thread's reusable Triton input and requested outputs"""
+    key = (input_name, output_name)
+    cached = getattr(_request_objects, "objects", None)
+    if cached is None or cached[0] != key:
+        triton_input = grpcclient.InferInput(input_name, [1, 1], "BYTES")
+        outputs = [grpcclient.InferRequestedOutput(output_name)]
+        cached = _request_objects.objects = (key, triton_input, outputs)
+    return cached[1], cached[2]
+
+
 class Channel:
     """Embedding channel implementation for inference"""
 
     default_embed_url = EMBEDDING_URL
     default_embed_model = "embedding"
 
+    # Seconds a health probe result is reused before the server is probed again
+    health_ttl = 5.0
+    _health_lock = threading.Lock()
+    _health: Tuple[float, bool] = (float("-inf"), False)
+
     @classmethod
     def is_available(cls) -> bool:
         return cls.is_embed_available()
 
     @classmethod
     def is_embed_available(cls) -> bool:
+        """Return whether the embedding model is ready, probing at most once per health_ttl"""
+        checked_at, available = cls._health
+        if time.monotonic() - checked_at < cls.health_ttl:
+            return available
+
+        with cls._health_lock:
+            # Another thread may have probed while this one waited for the lock
+            checked_at, available = cls._health
+            if time.monotonic() - checked_at < cls.health_ttl:
+                return available
+            available = cls._probe_embed_available()
+            cls._health = (time.monotonic(), available)
+        return available
+
+    @classmethod
+    def _probe_embed_available(cls) -> bool:
+        if not _HAS_TRITON:
+            return False
         try:
             triton_client = get_triton_client(url=cls.default_embed_url)
 
@@ -71,12 +161,25 @@ class Channel:
         model_version: Optional[str] = "",
         triton_url: str = None,
         batch_size: int = 128,
+        max_in_flight: int = 4,
         *args,
         **kwargs,
-    ) -> Union[Dict[str, Any], List[float], List[List[float]]]:
-        try:
-            import tritonclient.grpc as grpcclient
+    ) -> Dict[str, Any]:
+        if not _HAS_TRITON:
+            logger.warning(
+                "WARNING: tritonclient module not found. Using dummy embeddings."
+            )
+            # Generate dummy embeddings for testing without Triton server
+            dummy_embeddings = np.random.default_rng().standard_normal(
+                (len(input), 1536), dtype=np.float32
+            )
+            return {
+                "embeddings": dummy_embeddings,
+                "model_version": "dummy",
+                "metadata": {},
+            }
 
+        try:
             model_name = model_name or cls.default_embed_model
             triton_url = triton_url or cls.default_embed_url
 
@@ -85,33 +188,64 @@ class Channel:
             input_name = "INPUT"
             output_name = "OUTPUT"
 
-            embeddings = []
-            version = None
+            triton_input, outputs = _get_request_objects(input_name, output_name)
+            triton_inputs = [triton_input]
+
+            # The encoder pads every text to the longest one in its batch, so when the
+            # input spans several batches, batch texts of similar length together
+            order = None
+            if len(input) > batch_size:
+                order = np.argsort([len(text) for text in input], kind="stable")
+                input = [input[i] for i in order]
+
+            # Issue the batches without waiting for the previous result, so sending
+            # batch N+1 overlaps with the server computing batch N
+            in_flight = threading.BoundedSemaphore(max_in_flight)
+            pending = []
             for bi in range(0, len(input), batch_size):
                 batch_inputs = input[bi : bi + batch_size]
 
-                triton_inputs = [
-                    grpcclient.InferInput(input_name, [len(batch_inputs), 1], "BYTES")
-                ]
-                input_array = np.array(
-                    [str(text).encode("UTF-8") for text in batch_inputs]
-                )
-                input_array = np.expand_dims(input_array, axis=1)
-                triton_inputs[0].set_data_from_numpy(input_array)
-
-                outputs = [grpcclient.InferRequestedOutput(output_name)]
+                # Triton's BYTES serializer UTF-8 encodes str objects itself
+                input_array = np.asarray(batch_inputs, dtype=object)[:, None]
+                triton_input.set_shape([len(batch_inputs), 1])
+                triton_input.set_data_from_numpy(input_array)
+
+                future = concurrent.futures.Future()
+
+                def on_complete(result, error, future=future):
+                    in_flight.release()
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(result)
+
+                in_flight.acquire()
+                try:
+                    # The request is serialized before async_infer returns, so the
+                    # input can be refilled for the next batch right away
+                    triton_client.async_infer(
+                        model_name=model_name,
+                        model_version=model_version,
+                        inputs=triton_inputs,
+                        callback=on_complete,
+                        outputs=outputs,
+                    )
+                except Exception:
+                    in_flight.release()
+                    raise
+                pending.append(future)
 
-                infer_result = triton_client.infer(
-                    model_name=model_name,
-                    model_version=model_version,
-                    inputs=triton_inputs,
-                    outputs=outputs,
-                )
+            # Batches stay numpy arrays, converting them to lists would box every float
+            chunks = []
+            version = None
+            for future in pending:
+                infer_result = future.result()
                 response = infer_result.get_response()
-                batch_embeddings = infer_result.as_numpy(output_name).tolist()
                 cur_version = response.model_version
 
-                embeddings.extend(batch_embeddings)
+                chunks.append(
+                    infer_result.as_numpy(output_name).astype(EMBEDDING_DTYPE, copy=False)
+                )
                 if version is None:
                     version = cur_version
                 elif version != cur_version:
@@ -119,69 +253,344 @@ class Channel:
                         "Model version changed during embedding generation."
                     )
 
+            embeddings = (
+                np.concatenate(chunks, axis=0)
+                if chunks
+                else np.empty((0, 0), dtype=EMBEDDING_DTYPE)
+            )
+            if order is not None:
+                # Restore the caller's order
+                unsorted = np.empty_like(embeddings)
+                unsorted[order] = embeddings
+                embeddings = unsorted
             return {"embeddings": embeddings, "model_version": version, "metadata": {}}
 
-        except ImportError:
-            logger.warning(
-                "WARNING: tritonclient module not found. Using dummy embeddings."
-            )
-            # Generate dummy embeddings for testing without Triton server
-            dummy_embeddings = [
-                list(np.random.rand(1536).astype(float)) for _ in range(len(input))
-            ]
-            return {
-                "embeddings": dummy_embeddings,
-                "model_version": "dummy",
-                "metadata": {},
-            }
         except Exception as e:
             logger.error(f"Error generating embeddings: {str(e)}")
             raise
 
+    @classmethod
+    def embed_one(
+        cls,
+        text: str,
+        model_name: Optional[str] = None,
+        model_version: Optional[str] = "",
+        triton_url: str = None,
+    ) -> np.ndarray:
+        """Embed a single text with one blocking request, skipping the batch loop"""
+        if not _HAS_TRITON:
+            return cls.embed([text])["embeddings"][0]
 
-async def generate_embeddings(texts: List[str]) -> Tuple[List[List[float]], float]:
-    """Generate embeddings using the Channel class"""
-    logger.debug(f"Generating embeddings for {len(texts)} texts")
-    # Use the inline Channel implementation
-    start_time = time.time()
-    result = Channel.embed(input=texts)
-    end_time = time.time()
-    latency = end_time - start_time
-    logger.debug(
-        f"Generated {len(result['embeddings'])} embeddings with dimension {len(result['embeddings'][0]) if result['embeddings'] else 0} in {latency:.2f} seconds"
-    )
-    return result["embeddings"], latency
+        try:
+            triton_client = get_triton_client(url=triton_url or cls.default_embed_url)
+            triton_input, outputs = _get_request_objects("INPUT", "OUTPUT")
+
+            input_array = np.empty((1, 1), dtype=object)
+            input_array[0, 0] = text
+            triton_input.set_shape([1, 1])
+            triton_input.set_data_from_numpy(input_array)
+
+            infer_result = triton_client.infer(
+                model_name=model_name or cls.default_embed_model,
+                model_version=model_version,
+                inputs=[triton_input],
+                outputs=outputs,
+            )
+            return infer_result.as_numpy("OUTPUT")[0].astype(EMBEDDING_DTYPE, copy=False)
+
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {str(e)}")
+            raise
 
 
-async def query_to_vss(vector: List[float], text: str, top_k: int = 5):
-    payload = json.dumps(
+def warmup() -> None:
+    """Open the Triton connection and run one tiny inference ahead of the first query
+
+    Failures are logged and swallowed, an unreachable server must not block startup.
+    """
+    if not _HAS_TRITON:
+        return
+    try:
+        start_time = time.perf_counter_ns()
+        get_triton_client(url=EMBEDDING_URL).is_server_ready()
+        Channel.embed_one("__warmup__")
+        logger.info(
+            "Embedding warmup finished in %.2f seconds",
+            (time.perf_counter_ns() - start_time) / 1e9,
+        )
+    except Exception:
+        logger.warning("Embedding warmup failed", exc_info=True)
+
+
+# Blocking Triton calls run on their own threads, so a burst of embeddings neither
+# queues behind nor starves other work on the default executor
+_embedding_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv("EMBEDDING_THREADS", "8")),
+    thread_name_prefix="triton",
+)
+
+
+class EmbeddingBatcher:
+    """Coalesce concurrent embedding requests into batched Triton calls.
+
+    Texts submitted within `max_delay` seconds of each other are embedded with one
+    `Channel.embed` call of up to `max_batch` texts (a lone text uses
+    `Channel.embed_one`), and every caller gets back the embeddings of its own texts. A batcher is bound to the event loop it is used on.
+    """
+
+    def __init__(self, max_batch: int = 128, max_delay: float = 0.003):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed `texts` as part of the next batch, one row per text"""
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in texts]
+        for text, future in zip(texts, futures):
+            self._queue.put_nowait((text, future))
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        rows = await asyncio.gather(*futures)
+        return np.stack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+    async def close(self) -> None:
+        """Stop the worker task and cancel the requests still waiting for a batch"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            # Give concurrent callers a moment to join the batch
+            if self.max_delay > 0:
+                await asyncio.sleep(self.max_delay)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                # The gRPC client is blocking, keep it off the event loop
+                loop = asyncio.get_running_loop()
+                if len(batch) == 1:
+                    embeddings = [
+                        await loop.run_in_executor(
+                            _embedding_executor, Channel.embed_one, batch[0][0]
+                        )
+                    ]
+                else:
+                    result = await loop.run_in_executor(
+                        _embedding_executor,
+                        Channel.embed,
+                        [text for text, _ in batch],
+                    )
+                    embeddings = result["embeddings"]
+            except asyncio.CancelledError:
+                # The batcher is closing, release the callers waiting on this batch
+                for _, future in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+
+class EmbeddingCache:
+    """LRU cache of text embeddings.
+
+    Keys are the stripped texts. Entries expire after `max_age` seconds so that
+    vectors from a replaced embedding model do not outlive it for long.
+    """
+
+    def __init__(self, maxsize: int = 50_000, max_age: float = 86400.0):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._entries: OrderedDict[str, Tuple[np.ndarray, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached embedding of `text`, if any"""
+        key = text.strip()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        embedding, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return embedding
+
+    def put(self, text: str, embedding: np.ndarray) -> None:
+        """Store the embedding of `text`, evicting the least recently used entry if full"""
+        key = text.strip()
+        # Copy so the entry does not keep the whole batch array alive
+        self._entries[key] = (np.array(embedding), time.monotonic() + self.max_age)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._entries.clear()
+
+
+EMBEDDING_MAX_BATCH = 128
+EMBEDDING_MAX_DELAY = float(os.getenv("EMBEDDING_BATCH_DELAY_MS", "3")) / 1000
+# Set EMBEDDING_CACHE_SIZE=0 to disable the embedding cache
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "50000"))
+EMBEDDING_CACHE_MAX_AGE = float(os.getenv("EMBEDDING_CACHE_MAX_AGE_S", "86400"))
+
+embedding_cache = EmbeddingCache(
+    maxsize=EMBEDDING_CACHE_SIZE, max_age=EMBEDDING_CACHE_MAX_AGE
+)
+
+_batchers: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Get the embedding batcher of the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = EmbeddingBatcher(
+            max_batch=EMBEDDING_MAX_BATCH, max_delay=EMBEDDING_MAX_DELAY
+        )
+    return batcher
+
+
+async def close_embedding_batcher() -> None:
+    """Stop the embedding batcher of the running event loop, if any"""
+    batcher = _batchers.pop(asyncio.get_running_loop(), None)
+    if batcher is not None:
+        await batcher.close()
+
+
+async def generate_embeddings(texts: List[str]) -> Tuple[np.ndarray, float]:
+    """Generate embeddings using the Channel class, as an (N, D) array
+
+    Previously embedded texts are served from the embedding cache. The remaining
+    texts of concurrent calls are coalesced into shared Triton requests by the
+    event loop's EmbeddingBatcher.
+    """
+    logger.debug("Generating embeddings for %d texts", len(texts))
+    start_time = time.perf_counter_ns()
+    if EMBEDDING_CACHE_SIZE > 0:
+        rows = [embedding_cache.get(text) for text in texts]
+        misses = [i for i, row in enumerate(rows) if row is None]
+        if misses:
+            computed = await get_embedding_batcher().embed([texts[i] for i in misses])
+            for i, row in zip(misses, computed):
+                embedding_cache.put(texts[i], row)
+                rows[i] = row
+        embeddings = np.stack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+    else:
+        embeddings = await get_embedding_batcher().embed(texts)
+    latency = (time.perf_counter_ns() - start_time) / 1e9
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Generated %d embeddings with dimension %d in %.2f seconds",
+            len(embeddings),
+            embeddings.shape[1] if len(embeddings) else 0,
+            latency,
+        )
+    return embeddings, latency
+
+
+# aiohttp sessions are bound to the event loop they are created on, so one is kept per loop
+_http_sessions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Get the pooled HTTP session of the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    session = _http_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=20,
+                keepalive_timeout=30,
+                ttl_dns_cache=300,
+            ),
+            timeout=aiohttp.ClientTimeout(total=30, connect=5),
+        )
+        _http_sessions[loop] = session
+    return session
+
+
+async def close_http_session() -> None:
+    """Close the pooled HTTP session of the running event loop, if any"""
+    session = _http_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+# The constant part of every VSS request body, encoded once: the object without its
+# closing brace, ready for the per-query fields to be appended
+_VSS_PAYLOAD_PREFIX = (
+    orjson.dumps(
         {
             "db_provider": "pinecone",
             "namespace": PINECONE_NAMESPACE,
             "channel_id": CHANNEL_ID,
             "model_version": "240718",
             "type": "chunk",
-            "vector": vector,
-            "text": text,
-            "top_k": top_k,
             "lang": "ko",
         }
+    )[:-1]
+    + b","
+)
+
+
+async def query_to_vss(vector: Union[np.ndarray, List[float]], text: str, top_k: int = 5):
+    # orjson encodes the float vector in C. Embeddings may be float16 (EMBEDDING_FP16),
+    # which not every orjson version serializes, so the vector is sent as float32
+    vector = np.asarray(vector, dtype=np.float32)
+    data = b"".join(
+        (
+            _VSS_PAYLOAD_PREFIX,
+            b'"top_k":',
+            orjson.dumps(int(top_k)),
+            b',"text":',
+            orjson.dumps(text),
+            b',"vector":',
+            orjson.dumps(vector, option=orjson.OPT_SERIALIZE_NUMPY),
+            b"}",
+        )
     )
-    headers = {"Content-Type": "application/json"}
-
-    response = requests.request("POST", VSS_RETRIEVE_URL, headers=headers, data=payload)
 
-    return response.json()
+    session = get_http_session()
+    async with session.post(
+        VSS_RETRIEVE_URL, data=data, headers={"Content-Type": "application/json"}
+    ) as response:
+        # Parse regardless of the declared content type, as before with requests
+        return orjson.loads(await response.read())
 
 
 if __name__ == "__main__":
-    import asyncio
 
     async def main():
         query = "airCloset Dressにおいて、お客様が起因で汚損・紛失があった場合の対応について、暫定対応も含め教えて下さい"
         embeddings, latency = await generate_embeddings([query])
         # print(f"Latency: {latency:.2f} seconds")
-        print(f"First embedding: {embeddings[0] if embeddings else []}")
+        print(f"First embedding: {embeddings[0] if len(embeddings) else []}")
 
         # results = await query_to_vss(embeddings[0], query)
         # print(results)
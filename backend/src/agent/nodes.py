@@ -1,19 +1,37 @@
-import os
-import traceback
 import asyncio
+import collections
+import functools
+import hashlib
+import logging
+import os
+import re
+import weakref
+from typing import TYPE_CHECKING
+
+from langchain_core.exceptions import OutputParserException
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
-from langchain_google_genai import ChatGoogleGenerativeAI
-from google.genai import Client
+from pydantic import BaseModel, ValidationError
 
 from agent.schemas import (
     SearchQueryList,
     Reflection,
+    ReflectionWithDraft,
     QueryClassification,
     InputGuardrailResult,
+    GuardrailCheck,
     IntentClarityResult,
 )
-from agent.tools import retrieve_tool
+from agent.retry import with_retry
+from agent.tools import search_knowledge
+from agent.cache import (
+    HotQueryCache,
+    SemanticCache,
+    cached_acall,
+    detect_script,
+    embed_text,
+    normalize_query,
+)
 from agent.state import (
     OverallState,
     QueryGenerationState,
@@ -29,27 +47,190 @@ from agent.prompts import (
     knowledge_query_writer_instructions,
     web_searcher_instructions,
     reflection_instructions,
+    reflection_draft_instructions,
     knowledge_reflection_instructions,
+    knowledge_reflection_draft_instructions,
     answer_instructions,
     query_classification_instructions,
     direct_answer_instructions,
     input_guardrail_instructions,
+    guardrail_check_instructions,
+    GUARDRAIL_CATEGORIES,
     intent_clarify_instructions,
+    structured_output_retry_instructions,
 )
 from agent.utils import (
     get_citations,
     get_research_topic,
     insert_citation_markers,
+    replace_short_urls,
     resolve_urls,
+    ShortUrlReplacer,
     format_conversation_history,
     get_latest_user_message,
+    join_summaries,
+)
+
+if TYPE_CHECKING:
+    from google.genai import Client
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+logger = logging.getLogger(__name__)
+
+
+# The Google SDKs are imported and their clients built on first use, so importing
+# this module stays cheap for cold starts and does not need the API key yet
+@functools.lru_cache(maxsize=1)
+def _genai_client() -> "Client":
+    """Return the shared google-genai client, used for the Google Search API."""
+    from google.genai import Client
+
+    return Client(api_key=os.getenv("GEMINI_API_KEY"))
+
+
+@functools.lru_cache(maxsize=16)
+def _get_llm(model: str, temperature: float) -> "ChatGoogleGenerativeAI":
+    """Return a shared Gemini chat model for the given model name and temperature."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        # Retries are handled by with_retry, which skips non-transient errors
+        max_retries=0,
+        api_key=os.getenv("GEMINI_API_KEY"),
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def _get_structured_llm(model: str, temperature: float, schema: type[BaseModel]):
+    """Return a shared runnable that parses the model output into `schema`."""
+    return _get_llm(model, temperature).with_structured_output(schema)
+
+
+# Per event loop: (provider, limit) -> semaphore bounding concurrent calls
+_provider_semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _provider_semaphore(provider: str, limit: int) -> asyncio.Semaphore:
+    """Return the semaphore limiting concurrent `provider` calls to `limit`.
+
+    Semaphores are bound to the event loop they are used on, so one is kept per loop.
+    Web searches, knowledge searches and LLM calls use separate semaphores and don't
+    block each other.
+    """
+    semaphores = _provider_semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = semaphores.get((provider, limit))
+    if semaphore is None:
+        semaphore = semaphores[provider, limit] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+def _research_topic(state: OverallState) -> str:
+    """Return the research topic stored by prepare_turn for the current turn.
+
+    Falls back to building it from the messages if the state does not carry it.
+    """
+    return state.get("research_topic") or get_research_topic(state["messages"])
+
+
+def _latest_user_input(state: OverallState) -> str:
+    """Return the latest user message stored by prepare_turn for the current turn.
+
+    Falls back to looking it up in the messages if the state does not carry it.
+    """
+    return state.get("original_input") or get_latest_user_message(state["messages"])
+
+
+def prepare_turn(state: OverallState, config: RunnableConfig) -> OverallState:
+    """LangGraph node that derives the per-turn inputs shared by the later nodes.
+
+    Runs first on every turn, so the research topic and the latest user message are
+    extracted from the conversation once instead of in each node that needs them.
+
+    Args:
+        state: Current graph state containing the user's messages
+        config: Configuration for the runnable
+
+    Returns:
+        Dictionary with state update, including research_topic and original_input
+    """
+    return {
+        "research_topic": get_research_topic(state["messages"]),
+        "original_input": get_latest_user_message(state["messages"]),
+    }
+
+
+async def _ainvoke_limited(runnable, prompt: str):
+    """Invoke `runnable` once the process-wide LLM concurrency limit allows it.
+
+    The limit is read from the environment-level configuration, as it is shared by all runs.
+    """
+    limit = Configuration.from_runnable_config().max_concurrent_llm_calls
+    async with _provider_semaphore("llm", limit):
+        return await runnable.ainvoke(prompt)
+
+
+async def _ainvoke_structured(structured_llm, prompt: str):
+    """Invoke a structured-output runnable, retrying transient errors.
+
+    A response that cannot be parsed into the schema is not regenerated from scratch
+    by the transport retries: the model is asked once to fix it, quoting the error.
+    """
+    try:
+        result = await with_retry(lambda: _ainvoke_limited(structured_llm, prompt))
+        error = "no structured output was returned"
+    except (OutputParserException, ValidationError) as e:
+        result = None
+        error = str(e)
+    if result is not None:
+        return result
+
+    logger.warning("Structured output 파싱 실패, 수정 요청: %s", error)
+    retry_prompt = prompt + structured_output_retry_instructions.render(error=error)
+    result = await with_retry(lambda: _ainvoke_limited(structured_llm, retry_prompt))
+    if result is None:
+        raise OutputParserException(error)
+    return result
+
+
+# Semantic caches for the deterministic per-request checks. Guardrail verdicts are keyed
+# by the input of a first turn, since that is the whole text being checked, and as
+# they are safety-critical they are only reused within one language. The others are
+# keyed by the research topic.
+guardrail_caches: collections.defaultdict[str, SemanticCache] = collections.defaultdict(
+    SemanticCache
 )
+intent_cache = SemanticCache()
+classification_cache = SemanticCache()
 
-# Used for Google Search API
-genai_client = Client(api_key=os.getenv("GEMINI_API_KEY"))
+# Generated search queries for questions asked repeatedly, keyed by the normalized topic
+web_query_cache = HotQueryCache()
+knowledge_query_cache = HotQueryCache()
 
+# Direct answers keyed by the digest of the exact model and prompt; the prompt carries
+# the date and the conversation, so an entry is only reused for the same question that day
+answer_cache = HotQueryCache(hot_threshold=1, maxsize=2048)
 
-def input_guardrail(state: OverallState, config: RunnableConfig) -> OverallState:
+# Direct answers to first-turn questions per model, keyed by the research topic and
+# stored with the date they were generated on, so they are only reused the same day
+direct_answer_caches: collections.defaultdict[str, SemanticCache] = (
+    collections.defaultdict(SemanticCache)
+)
+
+
+# Words hinting at prompt injection, sensitive data or illegal requests; an input
+# containing one is always checked by the LLM, however trusted the conversation is
+_GUARDRAIL_TRIGGER_PATTERN = re.compile(
+    r"ignore|prompt|system|instruction|jailbreak|\bDAN\b|developer mode|password|bomb"
+    r"|무시|프롬프트|시스템|지시|탈옥|비밀번호|신용카드|카드번호|주민번호|주민등록|계좌|마약|폭탄|해킹",
+    re.IGNORECASE,
+)
+
+
+async def input_guardrail(
+    state: OverallState, config: RunnableConfig
+) -> OverallState:
     """LangGraph node that validates user input against security guardrails.
 
     Checks for potential security threats including:
@@ -58,20 +239,24 @@ def input_guardrail(state: OverallState, config: RunnableConfig) -> OverallState
     - Personal information extraction attempts
     - Illegal activity requests
 
+    By default each category is checked by its own concurrent LLM call. If
+    `guardrail_trusted_turns` is set (it is off by default), inputs without trigger
+    words are passed without an LLM check once a conversation has had that many
+    consecutive safe turns.
+
     Args:
         state: Current graph state containing the user's messages
         config: Configuration for the runnable, including LLM provider settings
 
     Returns:
-        Dictionary with state update, including is_safe_input, guardrail_violations, and original_input
+        Dictionary with state update, including is_safe_input, guardrail_violations, original_input and consecutive_safe_turns
     """
     configurable = Configuration.from_runnable_config(config)
+    safe_turns = state.get("consecutive_safe_turns") or 0
 
     # Extract the latest user message
-    user_messages = [
-        msg for msg in state["messages"] if hasattr(msg, "type") and msg.type == "human"
-    ]
-    if not user_messages:
+    latest_user_input = _latest_user_input(state)
+    if not latest_user_input:
         # No user messages found, treat as safe
         return {
             "is_safe_input": True,
@@ -79,44 +264,118 @@ def input_guardrail(state: OverallState, config: RunnableConfig) -> OverallState
             "original_input": "",
         }
 
-    latest_user_input = user_messages[-1].content
-
-    # init Gemini 2.0 Flash for guardrail validation
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=0.1,  # Low temperature for consistent security decisions
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
-    structured_llm = llm.with_structured_output(InputGuardrailResult)
+    # Continuations of a conversation that has stayed safe skip the LLM check
+    if (
+        configurable.guardrail_trusted_turns > 0
+        and safe_turns >= configurable.guardrail_trusted_turns
+        and not _GUARDRAIL_TRIGGER_PATTERN.search(latest_user_input)
+    ):
+        return {
+            "is_safe_input": True,
+            "guardrail_violations": [],
+            "original_input": latest_user_input,
+            "consecutive_safe_turns": safe_turns + 1,
+        }
 
-    # Format the prompt with user input and conversation history
     conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = input_guardrail_instructions.format(
-        user_input=latest_user_input, conversation_history=conversation_history
-    )
+    if configurable.parallel_guardrail_checks:
+        check_input = functools.partial(
+            _check_guardrail_categories,
+            configurable.query_generator_model,
+            conversation_history,
+            latest_user_input,
+        )
+    else:
+        # init Gemini 2.0 Flash for guardrail validation
+        structured_llm = _get_structured_llm(
+            configurable.query_generator_model,
+            0.1,  # Low temperature for consistent security decisions
+            InputGuardrailResult,
+        )
+        # Format the prompt with user input and conversation history
+        formatted_prompt = input_guardrail_instructions.render(
+            user_input=latest_user_input, conversation_history=conversation_history
+        )
+        check_input = functools.partial(
+            _ainvoke_structured, structured_llm, formatted_prompt
+        )
 
     # Validate the input
     try:
-        result = structured_llm.invoke(formatted_prompt)
+        # The verdict also depends on the conversation, so only first-turn inputs are
+        # cached, and inputs with trigger words always get a fresh check
+        if (
+            configurable.enable_semantic_cache
+            and len(state["messages"]) == 1
+            and not _GUARDRAIL_TRIGGER_PATTERN.search(latest_user_input)
+        ):
+            result = await cached_acall(
+                guardrail_caches[detect_script(latest_user_input)],
+                latest_user_input,
+                configurable.guardrail_cache_threshold,
+                check_input,
+            )
+        else:
+            result = await check_input()
 
         return {
             "is_safe_input": result.is_safe,
             "guardrail_violations": result.violations,
             "original_input": latest_user_input,
-            "messages": state["messages"],
+            "consecutive_safe_turns": safe_turns + 1 if result.is_safe else 0,
         }
-    except Exception as e:
+    except Exception:
         # In case of error, err on the side of safety
-        print(f"InputGuardrail 오류 발생: {traceback.format_exc()}")
+        logger.exception("InputGuardrail 오류 발생")
         return {
             "is_safe_input": False,
             "guardrail_violations": ["시스템 오류로 인한 안전성 확인 불가"],
             "original_input": latest_user_input,
-            "messages": state["messages"],
+            "consecutive_safe_turns": 0,
         }
 
 
+async def _check_guardrail_categories(
+    model: str, conversation_history: str, user_input: str
+) -> InputGuardrailResult:
+    """Check the input against every guardrail category with concurrent narrow prompts.
+
+    Each category gets its own small structured call, so the latency is that of the
+    slowest check rather than one call reasoning through all categories in sequence.
+    """
+    structured_llm = _get_structured_llm(
+        model,
+        0.1,  # Low temperature for consistent security decisions
+        GuardrailCheck,
+    )
+    checks = await asyncio.gather(
+        *(
+            _ainvoke_structured(
+                structured_llm,
+                guardrail_check_instructions.render(
+                    category=category,
+                    criteria=criteria,
+                    conversation_history=conversation_history,
+                    user_input=user_input,
+                ),
+            )
+            for category, criteria in GUARDRAIL_CATEGORIES
+        )
+    )
+
+    violated = [
+        (category, check)
+        for (category, _), check in zip(GUARDRAIL_CATEGORIES, checks)
+        if check.violated
+    ]
+    return InputGuardrailResult(
+        is_safe=not violated,
+        violations=[category for category, _ in violated],
+        reasoning=" ".join(check.reasoning for _, check in violated)
+        or "No guardrail category was violated.",
+    )
+
+
 def guardrail_block(state: OverallState, config: RunnableConfig) -> OverallState:
     """LangGraph node that handles blocked requests due to guardrail violations.
 
@@ -153,11 +412,11 @@ def guardrail_block(state: OverallState, config: RunnableConfig) -> OverallState
     }
 
 
-def intent_clarify(state: OverallState, config: RunnableConfig) -> OverallState:
+async def intent_clarify(state: OverallState, config: RunnableConfig) -> OverallState:
     """LangGraph node that analyzes user input for clarity and generates clarification questions if needed.
 
     Determines if the user's query is clear enough to provide a meaningful answer or if it needs
-    clarification questions to understand the specific intent. Limits clarification attempts to 3 times.
+    clarification questions to understand the specific intent. Limits clarification attempts to the configured max_intent_clarify_attempts.
 
     Args:
         state: Current graph state containing the user's messages
@@ -173,20 +432,20 @@ def intent_clarify(state: OverallState, config: RunnableConfig) -> OverallState:
 
     # If we've already asked for clarification max times, force proceed
     if current_count >= configurable.max_intent_clarify_attempts + 1:
-        print(f"Intent clarification 횟수 초과 ({current_count}번), 강제로 진행합니다.")
+        logger.info(
+            "Intent clarification 횟수 초과 (%d번), 강제로 진행합니다.", current_count
+        )
         return {
             "is_clear_intent": True,
             "needs_clarification": False,
             "clarification_questions": [],
             "intent_clarify_count": current_count,
-            "messages": state["messages"],
+            "prefetched_queries": [],
         }
 
     # Extract the latest user message
-    user_messages = [
-        msg for msg in state["messages"] if hasattr(msg, "type") and msg.type == "human"
-    ]
-    if not user_messages:
+    latest_user_input = _latest_user_input(state)
+    if not latest_user_input:
         # No user messages found, treat as needing clarification
         return {
             "is_clear_intent": False,
@@ -195,40 +454,82 @@ def intent_clarify(state: OverallState, config: RunnableConfig) -> OverallState:
                 "어떤 것을 도와드릴까요? 구체적으로 질문해주세요."
             ],
             "intent_clarify_count": current_count,
-            "messages": state["messages"],
+            "prefetched_queries": [],
         }
 
-    latest_user_input = user_messages[-1].content
+    # Obviously clear questions and inputs too short to mean anything need no LLM call.
+    # Later turns may be short replies to an earlier answer or clarification question,
+    # so only the first turn's input can be judged too short on its own
+    is_first_turn = not any(
+        isinstance(message, AIMessage) for message in state["messages"]
+    )
+    is_clear = (
+        _heuristic_intent_clarity(latest_user_input, is_first_turn)
+        if configurable.enable_intent_heuristics
+        else None
+    )
+    if is_clear is not None:
+        return {
+            "is_clear_intent": is_clear,
+            "needs_clarification": not is_clear,
+            "clarification_questions": []
+            if is_clear
+            else ["어떤 것을 도와드릴까요? 구체적으로 질문해주세요."],
+            "intent_clarify_count": current_count,
+            "prefetched_queries": [],
+        }
 
     # Initialize Gemini 2.0 Flash for intent clarity analysis
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=0.1,  # Low temperature for consistent analysis
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    structured_llm = _get_structured_llm(
+        configurable.query_generator_model,
+        0.1,  # Low temperature for consistent analysis
+        IntentClarityResult,
     )
-    structured_llm = llm.with_structured_output(IntentClarityResult)
 
     # Format the prompt with user input and conversation history
     conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = intent_clarify_instructions.format(
+    formatted_prompt = intent_clarify_instructions.render(
         user_input=latest_user_input, conversation_history=conversation_history
     )
 
-    # Analyze the intent clarity
+    # Generate the initial search queries while the intent is being checked, so a
+    # clear question does not wait for a second serial LLM call afterwards
+    query_writer = (
+        _initial_query_writer(state)
+        if configurable.speculative_query_generation
+        else None
+    )
+    prefetch = None
+    if query_writer is not None:
+        prefetch = asyncio.create_task(
+            _write_search_queries(state, configurable, *query_writer)
+        )
+
+    # Analyze the intent clarity, reusing the verdict for a near-duplicate topic
     try:
-        result = structured_llm.invoke(formatted_prompt)
+        if configurable.enable_semantic_cache:
+            result = await cached_acall(
+                intent_cache,
+                _research_topic(state),
+                configurable.intent_cache_threshold,
+                functools.partial(_ainvoke_structured, structured_llm, formatted_prompt),
+            )
+        else:
+            result = await _ainvoke_structured(structured_llm, formatted_prompt)
 
         return {
             "is_clear_intent": result.is_clear,
             "needs_clarification": result.needs_clarification,
             "clarification_questions": result.clarification_questions,
             "intent_clarify_count": current_count,
-            "messages": state["messages"],
+            "prefetched_queries": await _collect_prefetch(
+                prefetch, discard=result.needs_clarification
+            ),
         }
-    except Exception as e:
+    except Exception:
         # In case of error, assume clarification is needed for safety
-        print(f"Intent Clarification 오류 발생: {traceback.format_exc()}")
+        logger.exception("Intent Clarification 오류 발생")
+        await _collect_prefetch(prefetch, discard=True)
         return {
             "is_clear_intent": False,
             "needs_clarification": True,
@@ -236,10 +537,78 @@ def intent_clarify(state: OverallState, config: RunnableConfig) -> OverallState:
                 "죄송합니다. 질문을 더 자세히 설명해 주실 수 있나요?"
             ],
             "intent_clarify_count": current_count,
-            "messages": state["messages"],
+            "prefetched_queries": [],
         }
 
 
+# Interrogatives and request verbs that make a multi-word message an explicit question
+_QUESTION_PATTERN = re.compile(
+    r"\?|어떻게|무엇|뭐|왜|언제|어디|얼마|어떤|알려|방법|설명|궁금"
+    r"|\b(?:how|what|why|when|where|which|who)\b",
+    re.IGNORECASE,
+)
+
+# Pointing words whose referent only the conversation can tell, e.g. "이거 어떻게 해요?"
+_DEICTIC_PATTERN = re.compile(
+    r"이거|그거|저거|이것|그것|저것|이게|그게|저게|\b(?:this|that|it|these|those)\b",
+    re.IGNORECASE,
+)
+
+
+def _heuristic_intent_clarity(text: str, is_first_turn: bool) -> bool | None:
+    """Decide the intent clarity of a message without an LLM when it is obvious.
+
+    Returns False for a first-turn input shorter than 4 characters, True for messages
+    of at least 3 words phrased as an explicit question without pointing words, and
+    None when the LLM has to decide, e.g. for a short reply that the conversation
+    gives meaning to or a question about "this" or "that".
+    """
+    text = text.strip() if isinstance(text, str) else ""
+    if len(text) < 4:
+        return False if is_first_turn else None
+    if (
+        len(text.split()) >= 3
+        and _QUESTION_PATTERN.search(text)
+        and not _DEICTIC_PATTERN.search(text)
+    ):
+        return True
+    return None
+
+
+def _initial_query_writer(state: OverallState):
+    """Return the prompt and cache of the query generation node the search will start with.
+
+    Mirrors the routing after intent_clarify: web search takes precedence over knowledge
+    search. Returns None if the classification needs no search.
+    """
+    if state.get("needs_web_search"):
+        return query_writer_instructions, web_query_cache
+    if state.get("needs_knowledge_search"):
+        return knowledge_query_writer_instructions, knowledge_query_cache
+    return None
+
+
+async def _collect_prefetch(prefetch, discard: bool) -> list[str]:
+    """Return the speculatively generated queries, or cancel the generation if unused.
+
+    A failed generation yields no queries, the query generation node then retries it.
+    """
+    if prefetch is None:
+        return []
+    if discard:
+        if not prefetch.done():
+            prefetch.cancel()
+        elif not prefetch.cancelled():
+            # Retrieve a failure so it is not reported as never retrieved
+            prefetch.exception()
+        return []
+    try:
+        return await prefetch
+    except Exception:
+        logger.warning("검색 쿼리 선행 생성 실패", exc_info=True)
+        return []
+
+
 def provide_clarification(state: OverallState, config: RunnableConfig) -> OverallState:
     """LangGraph node that provides clarification questions to the user.
 
@@ -297,7 +666,7 @@ def provide_clarification(state: OverallState, config: RunnableConfig) -> Overal
     }
 
 
-def classify_query(
+async def classify_query(
     state: OverallState, config: RunnableConfig
 ) -> QueryClassificationState:
     """LangGraph node that classifies whether a query needs web search, knowledge search, or can be answered directly.
@@ -311,59 +680,100 @@ def classify_query(
         config: Configuration for the runnable, including LLM provider settings and search_mode
 
     Returns:
-        Dictionary with state update, including needs_web_search, needs_knowledge_search and query classification info
+        Dictionary with state update, including needs_web_search, needs_knowledge_search, and query classification info
     """
     configurable = Configuration.from_runnable_config(config)
+    research_topic = _research_topic(state)
 
     # Force specific search based on search_mode
     if configurable.force_search_mode == "web":
-        print("Force search mode가 'web'으로 설정되어 웹 검색을 강제 실행합니다.")
+        logger.info("Force search mode가 'web'으로 설정되어 웹 검색을 강제 실행합니다.")
         return {
             "needs_web_search": True,
             "needs_knowledge_search": False,
             "query_classification": "web_search_required",
-            "messages": state["messages"],
         }
     elif configurable.force_search_mode == "knowledge":
-        print("Force search mode가 'knowledge'로 설정되어 지식 검색을 강제 실행합니다.")
+        logger.info("Force search mode가 'knowledge'로 설정되어 지식 검색을 강제 실행합니다.")
         return {
             "needs_web_search": False,
             "needs_knowledge_search": True,
             "query_classification": "knowledge_search_required",
-            "messages": state["messages"],
+        }
+
+    # Plain greetings and thanks opening a conversation need no LLM classification
+    if len(state["messages"]) == 1 and _is_smalltalk(_latest_user_input(state)):
+        return {
+            "needs_web_search": False,
+            "needs_knowledge_search": False,
+            "query_classification": "smalltalk",
         }
 
     # Default auto behavior - perform normal classification
     # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=0.3,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    structured_llm = _get_structured_llm(
+        configurable.query_generator_model, 0.3, QueryClassification
     )
-    structured_llm = llm.with_structured_output(QueryClassification)
 
     # Format the prompt
     current_date = get_current_date()
     conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = query_classification_instructions.format(
+    formatted_prompt = query_classification_instructions.render(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
+        research_topic=research_topic,
         conversation_history=conversation_history,
     )
 
-    # Classify the query
-    result = structured_llm.invoke(formatted_prompt)
+    # Classify the query, reusing the result for a near-duplicate topic
+    if configurable.enable_semantic_cache:
+        result = await cached_acall(
+            classification_cache,
+            research_topic,
+            configurable.classification_cache_threshold,
+            functools.partial(_ainvoke_structured, structured_llm, formatted_prompt),
+        )
+    else:
+        result = await _ainvoke_structured(structured_llm, formatted_prompt)
 
     return {
         "needs_web_search": result.needs_web_search,
         "needs_knowledge_search": result.needs_knowledge_search,
         "query_classification": result.query_type,
-        "messages": state["messages"],
     }
 
 
-def direct_answer(state: OverallState, config: RunnableConfig) -> OverallState:
+# Whole-message greetings and thanks, optionally followed by punctuation or emoticons
+_SMALLTALK_PATTERN = re.compile(
+    r"(?:안녕(?:하세요|하십니까)?|하이|헬로|반가워요|반갑습니다|감사합니다|고맙습니다|고마워요?"
+    r"|hello|hi|hey|thanks?(?: you)?|good (?:morning|afternoon|evening))"
+    r"[\s!.~?^ㅎㅋ]*",
+    re.IGNORECASE,
+)
+
+
+def _is_smalltalk(text: str) -> bool:
+    """Return whether the message is nothing but a greeting or thanks."""
+    return isinstance(text, str) and _SMALLTALK_PATTERN.fullmatch(text.strip()) is not None
+
+
+def merge_input_checks(state: OverallState, config: RunnableConfig) -> OverallState:
+    """LangGraph node that joins the parallel guardrail and classification branches.
+
+    `input_guardrail` and `classify_query` only depend on the per-turn inputs, so they
+    run concurrently after prepare_turn. This node waits for both so that routing can see
+    the guardrail verdict and the classification together.
+
+    Args:
+        state: Current graph state containing the guardrail and classification results
+        config: Configuration for the runnable
+
+    Returns:
+        Empty state update
+    """
+    return {}
+
+
+async def direct_answer(state: OverallState, config: RunnableConfig) -> OverallState:
     """LangGraph node that provides direct answers without web search.
 
     Responds to queries that don't require current information using the model's
@@ -381,29 +791,55 @@ def direct_answer(state: OverallState, config: RunnableConfig) -> OverallState:
 
     # Format the prompt
     current_date = get_current_date()
+    research_topic = _research_topic(state)
     conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = direct_answer_instructions.format(
+    formatted_prompt = direct_answer_instructions.render(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
+        research_topic=research_topic,
         conversation_history=conversation_history,
     )
 
-    # init LLM for direct answer
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0.7,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
+    cache_key = None
+    if configurable.enable_answer_cache:
+        cache_key = hashlib.sha256(
+            f"{reasoning_model}|{formatted_prompt}".encode()
+        ).hexdigest()
+        cached_answer = answer_cache.get(cache_key)
+        if cached_answer is not None:
+            return {"messages": [AIMessage(content=cached_answer)]}
+
+    # A first-turn answer depends on the question alone, so reuse the answer to a
+    # near-duplicate question asked the same day
+    embedding = None
+    if configurable.enable_semantic_cache and len(state["messages"]) == 1:
+        embedding = await embed_text(research_topic)
+        if embedding is not None:
+            cached = direct_answer_caches[reasoning_model].lookup(
+                embedding, configurable.direct_answer_cache_threshold
+            )
+            if cached is not None and cached[0] == current_date:
+                return {"messages": [AIMessage(content=cached[1])]}
 
-    result = llm.invoke(formatted_prompt)
+    # init LLM for direct answer
+    llm = _get_llm(reasoning_model, 0.7)
+
+    result = await with_retry(lambda: _ainvoke_limited(llm, formatted_prompt))
+    if isinstance(result.content, str) and result.content:
+        if cache_key is not None:
+            answer_cache.put(cache_key, result.content)
+        if embedding is not None:
+            direct_answer_caches[reasoning_model].store(
+                embedding, (current_date, result.content)
+            )
 
     return {
         "messages": [AIMessage(content=result.content)],
     }
 
 
-def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
+async def generate_query(
+    state: OverallState, config: RunnableConfig
+) -> QueryGenerationState:
     """LangGraph node that generates search queries based on the User's question.
 
     Uses Gemini 2.0 Flash to create an optimized search queries for web research based on
@@ -416,39 +852,76 @@ def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerati
     Returns:
         Dictionary with state update, including search_query key containing the generated queries
     """
+    # Use the queries intent_clarify generated alongside its check, if any
+    if state.get("prefetched_queries"):
+        return {"search_query": state["prefetched_queries"]}
+
     configurable = Configuration.from_runnable_config(config)
+    queries = await _write_search_queries(
+        state, configurable, query_writer_instructions, web_query_cache
+    )
+    return {"search_query": queries}
 
+
+async def _write_search_queries(
+    state: OverallState,
+    configurable: Configuration,
+    instructions,
+    query_cache: HotQueryCache,
+) -> list[str]:
+    """Generate the initial search queries for the research topic.
+
+    Args:
+        state: Current graph state containing the User's question
+        configurable: Resolved configuration of the run
+        instructions: Query writer prompt of the search type
+        query_cache: Cache of the queries generated for frequently repeated questions
+
+    Returns:
+        The generated search queries
+    """
     # check for custom initial search query count
-    if state.get("initial_search_query_count") is None:
-        state["initial_search_query_count"] = configurable.number_of_initial_queries
+    number_queries = state.get("initial_search_query_count")
+    if number_queries is None:
+        number_queries = configurable.number_of_initial_queries
+
+    # Reuse the queries generated for a frequently repeated question
+    current_date = get_current_date()
+    research_topic = _research_topic(state)
+    cache_key = (
+        configurable.query_generator_model,
+        number_queries,
+        current_date,
+        normalize_query(research_topic),
+    )
+    cached_queries = query_cache.get(cache_key)
+    if cached_queries is not None:
+        return list(cached_queries)
 
     # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    structured_llm = _get_structured_llm(
+        configurable.query_generator_model, 1.0, SearchQueryList
     )
-    structured_llm = llm.with_structured_output(SearchQueryList)
 
     # Format the prompt
-    current_date = get_current_date()
     conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = query_writer_instructions.format(
+    formatted_prompt = instructions.render(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        number_queries=state["initial_search_query_count"],
+        research_topic=research_topic,
+        number_queries=number_queries,
         conversation_history=conversation_history,
     )
     # Generate the search queries
-    result = structured_llm.invoke(formatted_prompt)
-    return {"search_query": result.query, "messages": state["messages"]}
+    result = await _ainvoke_structured(structured_llm, formatted_prompt)
+    query_cache.put(cache_key, tuple(result.query))
+    return result.query
 
 
-def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
+async def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     """LangGraph node that performs web research using the native Google Search API tool.
 
     Executes a web search using the native Google Search API tool in combination with Gemini 2.0 Flash.
+    The node is async so that the fan-out searches run concurrently on the graph's event loop.
 
     Args:
         state: Current graph state containing the search query and research loop count
@@ -461,21 +934,24 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     configurable = Configuration.from_runnable_config(config)
     # Get conversation history from the state messages
     conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = web_searcher_instructions.format(
+    formatted_prompt = web_searcher_instructions.render(
         current_date=get_current_date(),
         research_topic=state["search_query"],
         conversation_history=conversation_history,
     )
 
     # Uses the google genai client as the langchain client doesn't return grounding metadata
-    response = genai_client.models.generate_content(
-        model=configurable.query_generator_model,
-        contents=formatted_prompt,
-        config={
-            "tools": [{"google_search": {}}],
-            "temperature": 0,
-        },
-    )
+    async with _provider_semaphore("web", configurable.max_concurrent_web_searches):
+        response = await with_retry(
+            lambda: _genai_client().aio.models.generate_content(
+                model=configurable.query_generator_model,
+                contents=formatted_prompt,
+                config={
+                    "tools": [{"google_search": {}}],
+                    "temperature": 0,
+                },
+            )
+        )
     # resolve the urls to short urls for saving tokens and time
     resolved_urls = resolve_urls(
         response.candidates[0].grounding_metadata.grounding_chunks, state["id"]
@@ -483,7 +959,12 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     # Gets the citations and adds them to the generated text
     citations = get_citations(response, resolved_urls)
     modified_text = insert_citation_markers(response.text, citations)
-    sources_gathered = [item for citation in citations for item in citation["segments"]]
+    # A source cited by several segments is only gathered once
+    unique_sources = {}
+    for citation in citations:
+        for item in citation["segments"]:
+            unique_sources.setdefault(item["short_url"], item)
+    sources_gathered = list(unique_sources.values())
 
     return {
         "sources_gathered": sources_gathered,
@@ -492,7 +973,7 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     }
 
 
-def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
+async def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
     """LangGraph node that identifies knowledge gaps and generates potential follow-up queries.
 
     Analyzes the current summary to identify areas for further research and generates
@@ -507,6 +988,11 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
         Dictionary with state update, including search_query key containing the generated follow-up query
     """
     configurable = Configuration.from_runnable_config(config)
+    # Only a sufficient first loop answers with the reflection's draft, so only the
+    # first reflection is asked for one
+    with_draft = (
+        configurable.enable_draft_answer and not state.get("research_loop_count")
+    )
     # Increment the research loop count and get the reasoning model
     state["research_loop_count"] = state.get("research_loop_count", 0) + 1
     reasoning_model = state.get("reasoning_model", configurable.reflection_model)
@@ -514,20 +1000,20 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
     # Format the prompt
     current_date = get_current_date()
     conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = reflection_instructions.format(
+    template = reflection_draft_instructions if with_draft else reflection_instructions
+    formatted_prompt = template.render(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n\n---\n\n".join(state["web_research_result"]),
+        research_topic=_research_topic(state),
+        summaries=join_summaries(
+            state["web_research_result"], "\n\n---\n\n", configurable.max_summary_chars
+        ),
         conversation_history=conversation_history,
     )
     # init Reasoning Model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    structured_llm = _get_structured_llm(
+        reasoning_model, 1.0, ReflectionWithDraft if with_draft else Reflection
     )
-    result = llm.with_structured_output(Reflection).invoke(formatted_prompt)
+    result = await _ainvoke_structured(structured_llm, formatted_prompt)
 
     return {
         "is_sufficient": result.is_sufficient,
@@ -535,16 +1021,19 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
         "follow_up_queries": result.follow_up_queries,
         "research_loop_count": state["research_loop_count"],
         "number_of_ran_queries": len(state["search_query"]),
-        "messages": state["messages"],
+        "draft_answer": getattr(result, "draft_answer", None) or "",
     }
 
 
-def finalize_answer(state: OverallState, config: RunnableConfig) -> OverallState:
+async def finalize_answer(state: OverallState, config: RunnableConfig) -> OverallState:
     """LangGraph node that finalizes the research summary.
 
     Prepares the final output by deduplicating and formatting sources, then
     combining them with the running summary to create a well-structured
     research report with proper citations. Handles both web search and knowledge search results.
+    The answer is streamed, so clients following the message stream see its tokens as they
+    are generated; the returned message keeps the streamed id with the short urls, which are
+    resolved chunk by chunk during the stream.
 
     Args:
         state: Current graph state containing the running summary and sources gathered
@@ -565,40 +1054,72 @@ def finalize_answer(state: OverallState, config: RunnableConfig) -> OverallState
     # Format the prompt
     current_date = get_current_date()
     conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = answer_instructions.format(
+    formatted_prompt = answer_instructions.render(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n---\n\n".join(all_summaries),
+        research_topic=_research_topic(state),
+        summaries=join_summaries(
+            all_summaries, "\n---\n\n", configurable.max_summary_chars
+        ),
         conversation_history=conversation_history,
     )
 
     # init Reasoning Model, default to Gemini 2.5 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    llm = _get_llm(reasoning_model, 0)
+
+    async def open_stream():
+        stream = llm.astream(formatted_prompt)
+        return stream, await anext(stream, None)
+
+    # Only failures before the first chunk are retried: once chunks have been streamed
+    # to the client, a retry would send the answer again under the same message id
+    stream, chunk = await with_retry(open_stream)
+
+    # Short urls are resolved while the answer streams, not in a pass afterwards
+    replacer = ShortUrlReplacer(state.get("sources_gathered"))
+    message_id = None
+    parts = []
+    while chunk is not None:
+        message_id = message_id or chunk.id
+        if isinstance(chunk.content, str):
+            parts.append(replacer.feed(chunk.content))
+        chunk = await anext(stream, None)
+    parts.append(replacer.flush())
+    content = "".join(parts)
+    unique_sources = replacer.cited_sources
+
+    return {
+        # Same id as the streamed message, so it replaces the unresolved stream
+        "messages": [AIMessage(content=content, id=message_id)],
+        "sources_gathered": unique_sources,
+        "research_loop_count": 0,  # reset research loop count
+    }
+
+
+def emit_draft(state: OverallState, config: RunnableConfig) -> OverallState:
+    """LangGraph node that answers with the draft written during reflection.
+
+    Used when the first research loop is already sufficient: the reflection step wrote
+    the answer together with its judgement, so the separate finalize_answer call is skipped.
+
+    Args:
+        state: Current graph state containing the draft answer and sources gathered
+        config: Configuration for the runnable
+
+    Returns:
+        Dictionary with state update, including the answer message and the cited sources
+    """
+    content, unique_sources = replace_short_urls(
+        state["draft_answer"], state.get("sources_gathered")
     )
-    result = llm.invoke(formatted_prompt)
-
-    # Replace the short urls with the original urls and add all used urls to the sources_gathered (for web search)
-    unique_sources = []
-    if state.get("sources_gathered"):
-        for source in state["sources_gathered"]:
-            if source["short_url"] in result.content:
-                result.content = result.content.replace(
-                    source["short_url"], source["value"]
-                )
-                unique_sources.append(source)
 
     return {
-        "messages": [AIMessage(content=result.content)],
+        "messages": [AIMessage(content=content)],
         "sources_gathered": unique_sources,
         "research_loop_count": 0,  # reset research loop count
     }
 
 
-def generate_knowledge_query(
+async def generate_knowledge_query(
     state: OverallState, config: RunnableConfig
 ) -> QueryGenerationState:
     """LangGraph node that generates knowledge search queries based on the User's question.
@@ -613,42 +1134,58 @@ def generate_knowledge_query(
     Returns:
         Dictionary with state update, including search_query key containing the generated queries
     """
+    # Use the queries intent_clarify generated alongside its check, if any
+    if state.get("prefetched_queries"):
+        return {"search_query": state["prefetched_queries"]}
+
     configurable = Configuration.from_runnable_config(config)
+    queries = await _write_search_queries(
+        state, configurable, knowledge_query_writer_instructions, knowledge_query_cache
+    )
+    return {"search_query": queries}
 
-    # check for custom initial search query count
-    if state.get("initial_search_query_count") is None:
-        state["initial_search_query_count"] = configurable.number_of_initial_queries
 
-    # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
-    structured_llm = llm.with_structured_output(SearchQueryList)
+async def embed_knowledge_queries(
+    state: OverallState, config: RunnableConfig
+) -> OverallState:
+    """LangGraph node that embeds the generated knowledge search queries in one batch.
 
-    # Format the prompt
-    current_date = get_current_date()
-    conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = knowledge_query_writer_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        number_queries=state["initial_search_query_count"],
-        conversation_history=conversation_history,
-    )
-    # Generate the search queries
-    result = structured_llm.invoke(formatted_prompt)
-    return {"search_query": result.query, "messages": state["messages"]}
+    Runs before the knowledge search fan-out so that the parallel searches share a
+    single embedding request instead of embedding their query one by one.
+
+    Args:
+        state: Current graph state containing the generated search queries
+        config: Configuration for the runnable
+
+    Returns:
+        Dictionary with state update, including query_embeddings aligned with the queries
+        sent to knowledge search (empty if embedding fails)
+    """
+    # Import here to avoid circular imports
+    from agent.internal.retrieve import generate_embeddings
+
+    # Same queries that continue_to_knowledge_search fans out
+    queries = state["search_query"][-3:]
+    try:
+        embeddings, _ = await generate_embeddings(queries)
+        # State is serialized for checkpoints and streaming, so store plain lists
+        embeddings = embeddings.tolist()
+    except Exception:
+        # Each knowledge search falls back to embedding its own query
+        logger.exception("지식 검색 쿼리 임베딩 오류")
+        embeddings = []
+
+    return {"query_embeddings": embeddings}
 
 
-def knowledge_search(
+async def knowledge_search(
     state: KnowledgeSearchState, config: RunnableConfig
 ) -> OverallState:
-    """LangGraph node that performs knowledge search using the retrieve_tool.
+    """LangGraph node that performs knowledge search on Channel Talk internal documentation.
 
-    Executes a knowledge search using the retrieve_tool to search Channel Talk internal documentation.
-    This implements the tool usage pattern in LangGraph where the node uses a tool to perform its function.
+    Uses the same search as the retrieve_tool, reusing the query embedding from
+    `embed_knowledge_queries` when the Send payload carries one.
+    The node is async so that the fan-out searches run concurrently on the graph's event loop.
 
     Args:
         state: Current graph state containing the search query and id
@@ -657,30 +1194,27 @@ def knowledge_search(
     Returns:
         Dictionary with state update, including knowledge_search_result key containing the search results
     """
-
-    async def _async_search():
-        try:
-            # Use the retrieve_tool to perform the search
-            # Call the tool function directly (since it's already async)
-            search_result = await retrieve_tool.ainvoke(
-                {"query": state["search_query"], "top_k": 10}
+    configurable = Configuration.from_runnable_config(config)
+    try:
+        async with _provider_semaphore(
+            "knowledge", configurable.max_concurrent_knowledge_searches
+        ):
+            search_result = await search_knowledge(
+                state["search_query"], top_k=10, embedding=state.get("query_embedding")
             )
 
-            return {
-                "knowledge_search_result": [search_result],
-                "search_query": [state["search_query"]],
-            }
-
-        except Exception as e:
-            print(f"지식 검색 중 오류가 발생했습니다: {traceback.format_exc()}")
-            error_message = f"지식 검색 중 오류가 발생했습니다: {str(e)}"
-            return {"knowledge_search_result": [error_message]}
+        return {
+            "knowledge_search_result": [search_result],
+            "search_query": [state["search_query"]],
+        }
 
-    # Run the async search
-    return asyncio.run(_async_search())
+    except Exception as e:
+        logger.exception("지식 검색 중 오류가 발생했습니다")
+        error_message = f"지식 검색 중 오류가 발생했습니다: {str(e)}"
+        return {"knowledge_search_result": [error_message]}
 
 
-def knowledge_reflection(
+async def knowledge_reflection(
     state: OverallState, config: RunnableConfig
 ) -> ReflectionState:
     """LangGraph node that identifies knowledge gaps and generates potential follow-up queries for Channel Talk knowledge.
@@ -697,6 +1231,11 @@ def knowledge_reflection(
         Dictionary with state update, including search_query key containing the generated follow-up query
     """
     configurable = Configuration.from_runnable_config(config)
+    # Only a sufficient first loop answers with the reflection's draft, so only the
+    # first reflection is asked for one
+    with_draft = (
+        configurable.enable_draft_answer and not state.get("research_loop_count")
+    )
     # Increment the research loop count and get the reasoning model
     state["research_loop_count"] = state.get("research_loop_count", 0) + 1
     reasoning_model = state.get("reasoning_model", configurable.reflection_model)
@@ -704,20 +1243,22 @@ def knowledge_reflection(
     # Format the prompt
     current_date = get_current_date()
     conversation_history = format_conversation_history(state["messages"])
-    formatted_prompt = knowledge_reflection_instructions.format(
+    template = knowledge_reflection_draft_instructions if with_draft else knowledge_reflection_instructions
+    formatted_prompt = template.render(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n\n---\n\n".join(state["knowledge_search_result"]),
+        research_topic=_research_topic(state),
+        summaries=join_summaries(
+            state["knowledge_search_result"],
+            "\n\n---\n\n",
+            configurable.max_summary_chars,
+        ),
         conversation_history=conversation_history,
     )
     # init Reasoning Model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    structured_llm = _get_structured_llm(
+        reasoning_model, 1.0, ReflectionWithDraft if with_draft else Reflection
     )
-    result = llm.with_structured_output(Reflection).invoke(formatted_prompt)
+    result = await _ainvoke_structured(structured_llm, formatted_prompt)
 
     return {
         "is_sufficient": result.is_sufficient,
@@ -725,5 +1266,5 @@ def knowledge_reflection(
         "follow_up_queries": result.follow_up_queries,
         "research_loop_count": state["research_loop_count"],
         "number_of_ran_queries": len(state["search_query"]),
-        "messages": state["messages"],
+        "draft_answer": getattr(result, "draft_answer", None) or "",
     }
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP status codes worth retrying: timeouts, rate limits and server errors
+_TRANSIENT_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Return whether an error from a model or search call is worth retrying.
+
+    Rate limits (429), server errors (5xx), timeouts and dropped connections are
+    transient. Client errors such as 400 and schema parse errors are not, since
+    repeating the same request would fail the same way.
+    """
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # google.api_core and google.genai errors carry the HTTP status as `code`
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    try:
+        return int(code) in _TRANSIENT_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+async def with_retry(
+    coro_factory: Callable[[], Awaitable[T]],
+    attempts: int = 3,
+    base_delay: float = 0.2,
+) -> T:
+    """Await `coro_factory()`, retrying transient errors with exponential backoff.
+
+    Args:
+        coro_factory: Function creating a fresh awaitable for every attempt
+        attempts: Maximum number of attempts
+        base_delay: Upper bound of the first backoff delay in seconds, doubled per attempt
+
+    Returns:
+        The result of the first successful attempt
+    """
+    for attempt in range(attempts):
+        try:
+            return await coro_factory()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient_error(e):
+                raise
+            # Full jitter keeps concurrent callers from retrying in lockstep
+            delay = random.uniform(0, base_delay * 2**attempt)
+            logger.warning(
+                "Transient error (attempt %d/%d), retrying in %.2fs: %s",
+                attempt + 1,
+                attempts,
+                delay,
+                e,
+            )
+            await asyncio.sleep(delay)
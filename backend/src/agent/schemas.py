@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -25,6 +25,15 @@ class Reflection(BaseModel):
     )
 
 
+class ReflectionWithDraft(Reflection):
+    """Reflection on the search results of the first research loop, with a draft answer."""
+
+    draft_answer: Optional[str] = Field(
+        default=None,
+        description="A complete answer to the question with cited sources if the results are sufficient, otherwise null.",
+    )
+
+
 class QueryClassification(BaseModel):
     """Classification of whether a query needs web search or can be answered directly."""
 
@@ -52,6 +61,13 @@ class InputGuardrailResult(BaseModel):
     reasoning: str = Field(description="Explanation of the guardrail decision.")
 
 
+class GuardrailCheck(BaseModel):
+    """Result of checking the input against a single guardrail category."""
+
+    violated: bool = Field(description="Whether the input violates the category.")
+    reasoning: str = Field(description="Short explanation of the decision.")
+
+
 class IntentClarityResult(BaseModel):
     """Result of intent clarity analysis."""
 
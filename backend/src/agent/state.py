@@ -10,21 +10,36 @@ from typing_extensions import Annotated
 import operator
 
 
+def merge_sources(existing: list, new: list) -> list:
+    """Reducer that appends gathered sources, keeping the first source per short url."""
+    merged = {}
+    for source in (*(existing or ()), *(new or ())):
+        merged.setdefault(source["short_url"], source)
+    return list(merged.values())
+
+
 class OverallState(TypedDict):
     """Main state used throughout the entire graph"""
 
     # Message related
     messages: Annotated[list, add_messages]
     original_input: str
+    # Written by prepare_turn on every turn so later nodes don't rebuild it
+    research_topic: str
 
     # Search query related
     search_query: Annotated[list[str], operator.add]
     initial_search_query_count: int
+    query_embeddings: list[list[float]]
+    # Initial queries generated by intent_clarify alongside its check, empty if none
+    prefetched_queries: list[str]
 
     # Search results related
+    # Append-only, in gathering order: the reflection prompts end with these results,
+    # so each research round's prompt starts with the previous round's prompt
     web_research_result: Annotated[list, operator.add]
     knowledge_search_result: Annotated[list, operator.add]
-    sources_gathered: Annotated[list, operator.add]
+    sources_gathered: Annotated[list, merge_sources]
 
     # Research loop control
     max_research_loops: int
@@ -41,6 +56,7 @@ class OverallState(TypedDict):
 
     # Guardrail related
     is_safe_input: bool
+    consecutive_safe_turns: int
     guardrail_violations: Annotated[list[str], operator.add]
 
     # Intent clarification related
@@ -53,6 +69,7 @@ class OverallState(TypedDict):
     knowledge_gap: str
     follow_up_queries: Annotated[list[str], operator.add]
     is_sufficient: bool
+    draft_answer: str
 
 
 class ReflectionState(TypedDict):
@@ -63,6 +80,7 @@ class ReflectionState(TypedDict):
     follow_up_queries: Annotated[list, operator.add]
     research_loop_count: int
     number_of_ran_queries: int
+    draft_answer: str
     messages: Annotated[list, add_messages]
 
 
@@ -101,6 +119,7 @@ class KnowledgeSearchState(TypedDict):
     """Knowledge search node state"""
 
     search_query: str
+    query_embedding: list[float]
     id: str
     messages: Annotated[list, add_messages]
 
@@ -1,18 +1,20 @@
+import logging
+from typing import List, Optional
+
 from langchain_core.tools import tool
-import asyncio
-import traceback
 
+logger = logging.getLogger(__name__)
 
-@tool
-async def retrieve_tool(query: str, top_k: int = 10) -> str:
-    """Internal knowledge search tool for Channel Talk service information.
 
-    This tool searches the internal Channel Talk knowledge base to find relevant
-    information about features, usage, troubleshooting, and other service-related topics.
+async def search_knowledge(
+    query: str, top_k: int = 10, embedding: Optional[List[float]] = None
+) -> str:
+    """Search the Channel Talk knowledge base and format the results.
 
     Args:
         query: The search query to find relevant information
-        top_k: Maximum number of search results to return (default: 10)
+        top_k: Maximum number of search results to return
+        embedding: Precomputed embedding of the query, generated if not given
 
     Returns:
         Formatted string containing the search results
@@ -21,11 +23,13 @@ async def retrieve_tool(query: str, top_k: int = 10) -> str:
         # Import here to avoid circular imports
         from agent.internal.retrieve import generate_embeddings, query_to_vss
 
-        # Generate embeddings for the search query
-        embeddings, latency = await generate_embeddings([query])
+        if embedding is None:
+            # Generate embeddings for the search query
+            embeddings, latency = await generate_embeddings([query])
+            embedding = embeddings[0]
 
         # Perform vector search
-        search_results = await query_to_vss(embeddings[0], query, top_k)
+        search_results = await query_to_vss(embedding, query, top_k)
 
         if not search_results:
             return "검색 결과가 없습니다. 다른 키워드로 다시 시도해보세요."
@@ -39,9 +43,26 @@ async def retrieve_tool(query: str, top_k: int = 10) -> str:
 
     except Exception as e:
         error_message = f"지식 검색 중 오류가 발생했습니다: {str(e)}"
-        print(f"retrieve_tool 오류: {traceback.format_exc()}")
+        logger.exception("retrieve_tool 오류")
         return error_message
 
 
+@tool
+async def retrieve_tool(query: str, top_k: int = 10) -> str:
+    """Internal knowledge search tool for Channel Talk service information.
+
+    This tool searches the internal Channel Talk knowledge base to find relevant
+    information about features, usage, troubleshooting, and other service-related topics.
+
+    Args:
+        query: The search query to find relevant information
+        top_k: Maximum number of search results to return (default: 10)
+
+    Returns:
+        Formatted string containing the search results
+    """
+    return await search_knowledge(query, top_k)
+
+
 # List of available tools
 TOOLS = [retrieve_tool]
@@ -1,4 +1,6 @@
-from typing import Any, Dict, List
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
 from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
 
 
@@ -23,6 +25,9 @@ def format_conversation_history(messages: List[AnyMessage]) -> str:
     """
     Format the conversation history for better context understanding.
 
+    Most nodes of a turn receive the same message list, so the result is memoized
+    on the identity and length of the list.
+
     Args:
         messages: List of messages from the conversation
 
@@ -35,9 +40,32 @@ def format_conversation_history(messages: List[AnyMessage]) -> str:
     if len(messages) == 1:
         return f"Current user query: {messages[-1].content}"
 
-    # Format the conversation history
+    key = id(messages)
+    entry = _formatted_histories.get(key)
+    # The list is kept in the entry, so a freed list's id reused by another can't match
+    if entry is not None and entry[0] is messages and entry[1] == len(messages):
+        _formatted_histories.move_to_end(key)
+        return entry[2]
+
+    conversation_context = _format_messages(messages)
+    _formatted_histories[key] = (messages, len(messages), conversation_context)
+    _formatted_histories.move_to_end(key)
+    while len(_formatted_histories) > _FORMATTED_HISTORIES_MAXSIZE:
+        _formatted_histories.popitem(last=False)
+    return conversation_context
+
+
+# Recently formatted message lists: id(list) -> (list, length, formatted history)
+_formatted_histories: "OrderedDict[int, Tuple[List[AnyMessage], int, str]]" = (
+    OrderedDict()
+)
+_FORMATTED_HISTORIES_MAXSIZE = 32
+
+
+def _format_messages(messages: List[AnyMessage]) -> str:
+    """Format the user and assistant messages of a conversation."""
     formatted_history = []
-    for i, message in enumerate(messages):
+    for message in messages:
         if isinstance(message, HumanMessage):
             formatted_history.append(f"User: {message.content}")
         elif isinstance(message, AIMessage):
@@ -78,6 +106,50 @@ def get_latest_user_message(messages: List[AnyMessage]) -> str:
     return ""
 
 
+_TRUNCATION_MARKER = "\n[...]"
+
+
+def join_summaries(summaries: List[str], separator: str, max_chars: int) -> str:
+    """
+    Join research summaries for a prompt, shortening the longest ones to fit a budget.
+
+    Summaries are never dropped or reordered. If the joined text would exceed
+    `max_chars`, every summary is capped at the same length, chosen so that the
+    result fits, and the capped ones are cut at a line break where possible.
+
+    Args:
+        summaries: Summaries in the order they were gathered
+        separator: String placed between the summaries
+        max_chars: Maximum length of the joined text, or 0 for no limit
+
+    Returns:
+        The joined summaries
+    """
+    joined = separator.join(summaries)
+    if max_chars <= 0 or len(joined) <= max_chars:
+        return joined
+
+    # Find the largest per-summary cap under which all summaries fit the budget
+    remaining = max_chars - len(separator) * (len(summaries) - 1)
+    cap = 0
+    lengths = sorted(len(summary) for summary in summaries)
+    for index, length in enumerate(lengths):
+        count = len(lengths) - index
+        if length * count > remaining:
+            cap = remaining // count
+            break
+        remaining -= length
+    keep = max(cap - len(_TRUNCATION_MARKER), 0)
+
+    shortened = []
+    for summary in summaries:
+        if len(summary) > cap:
+            cut = summary.rfind("\n", 0, keep)
+            summary = summary[: cut if cut > keep // 2 else keep] + _TRUNCATION_MARKER
+        shortened.append(summary)
+    return separator.join(shortened)
+
+
 def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
     """
     Create a map of the vertex ai search urls (very long) to a short url with a unique id for each url.
@@ -95,6 +167,107 @@ def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
     return resolved_map
 
 
+class ShortUrlReplacer:
+    """
+    Replace the short urls in a streamed text with the original urls as it arrives.
+
+    `feed` returns the text that is final so far. Only a tail that could still be the
+    start of a short url is held back, until more text or `flush` decides it.
+    """
+
+    def __init__(self, sources: List[Dict[str, Any]]):
+        self._sources_by_short_url = {}
+        for source in sources or ():
+            self._sources_by_short_url.setdefault(source["short_url"], source)
+
+        # Longest first, so that a short url never matches the prefix of a longer one
+        # (e.g. ".../id/0-1" inside ".../id/0-10")
+        self._pattern = (
+            re.compile(
+                "|".join(
+                    re.escape(short_url)
+                    for short_url in sorted(
+                        self._sources_by_short_url, key=len, reverse=True
+                    )
+                )
+            )
+            if self._sources_by_short_url
+            else None
+        )
+        self._holdback = max(map(len, self._sources_by_short_url), default=1) - 1
+        self._buffer = ""
+        self._used = set()
+
+    def feed(self, text: str) -> str:
+        """Add streamed text and return the replaced text that can no longer change."""
+        if self._pattern is None:
+            return text
+        self._buffer += text
+        # A match starting before `safe` is complete, since the longest short url
+        # starting there fits in the buffer
+        safe = len(self._buffer) - self._holdback
+        if safe <= 0:
+            return ""
+
+        parts = []
+        end = 0
+        for match in self._pattern.finditer(self._buffer):
+            if match.start() >= safe:
+                break
+            parts.append(self._buffer[end : match.start()])
+            parts.append(self._replace(match))
+            end = match.end()
+        # No match starts between `end` and `safe`, so that text is final as well
+        if end < safe:
+            parts.append(self._buffer[end:safe])
+            end = safe
+        self._buffer = self._buffer[end:]
+        return "".join(parts)
+
+    def flush(self) -> str:
+        """Return the replaced remainder of the stream."""
+        if self._pattern is None:
+            return ""
+        content = self._pattern.sub(self._replace, self._buffer)
+        self._buffer = ""
+        return content
+
+    @property
+    def cited_sources(self) -> List[Dict[str, Any]]:
+        """The sources cited so far, in gathering order."""
+        return [
+            source
+            for short_url, source in self._sources_by_short_url.items()
+            if short_url in self._used
+        ]
+
+    def _replace(self, match: re.Match) -> str:
+        short_url = match.group(0)
+        self._used.add(short_url)
+        return self._sources_by_short_url[short_url]["value"]
+
+
+def replace_short_urls(
+    content: str, sources: List[Dict[str, Any]]
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Replace the short urls in a text with the original urls in a single pass.
+
+    Args:
+        content: Text citing sources by their short urls
+        sources: Gathered sources with "short_url" and "value" keys
+
+    Returns:
+        The text with the original urls, and the sources it cites in gathering order
+    """
+    if not sources:
+        return content, []
+
+    replacer = ShortUrlReplacer(sources)
+    content = replacer.feed(content) + replacer.flush()
+    return content, replacer.cited_sources
+
+
 def insert_citation_markers(text, citations_list):
     """
     Inserts citation markers into a text string based on start and end indices.
@@ -0,0 +1,120 @@
+import pytest
+
+from agent import configuration
+from agent.configuration import Configuration
+
+
+@pytest.fixture(autouse=True)
+def clear_config_caches(monkeypatch):
+    for field_spec in configuration._FIELD_SPECS:
+        monkeypatch.delenv(field_spec[1], raising=False)
+    _clear_caches()
+    yield
+    _clear_caches()
+
+
+def _clear_caches():
+    configuration._env_values.cache_clear()
+    configuration._get_config.cache_clear()
+    configuration._default_config.cache_clear()
+
+
+def test_defaults_without_configurable():
+    config = Configuration.from_runnable_config()
+    assert config == Configuration()
+    # Nothing overridden: the shared default instance is returned
+    assert Configuration.from_runnable_config({}) is config
+    assert Configuration.from_runnable_config({"configurable": {}}) is config
+    assert Configuration.from_runnable_config({"configurable": {"thread_id": "t"}}) is config
+
+
+def test_configurable_overrides_default():
+    config = Configuration.from_runnable_config(
+        {"configurable": {"max_research_loops": 5}}
+    )
+    assert config.max_research_loops == 5
+    assert config.number_of_initial_queries == Configuration().number_of_initial_queries
+
+
+def test_environment_takes_precedence_over_configurable(monkeypatch):
+    monkeypatch.setenv("MAX_RESEARCH_LOOPS", "7")
+    config = Configuration.from_runnable_config(
+        {"configurable": {"max_research_loops": 5}}
+    )
+    assert config.max_research_loops == 7
+
+
+def test_environment_values_are_coerced(monkeypatch):
+    monkeypatch.setenv("MAX_RESEARCH_LOOPS", "4")
+    monkeypatch.setenv("GUARDRAIL_CACHE_THRESHOLD", "0.9")
+    monkeypatch.setenv("QUERY_GENERATOR_MODEL", "gemini-test")
+    config = Configuration.from_runnable_config()
+    assert config.max_research_loops == 4
+    assert config.guardrail_cache_threshold == 0.9
+    assert config.query_generator_model == "gemini-test"
+
+
+@pytest.mark.parametrize("value", ["false", "False", "0", "no", "off", ""])
+def test_false_bool_strings(monkeypatch, value):
+    monkeypatch.setenv("ENABLE_SEMANTIC_CACHE", value)
+    assert Configuration.from_runnable_config().enable_semantic_cache is False
+
+
+@pytest.mark.parametrize("value", ["true", "TRUE", "1", "yes", "on"])
+def test_true_bool_strings(monkeypatch, value):
+    monkeypatch.setenv("ENABLE_SEMANTIC_CACHE", value)
+    assert Configuration.from_runnable_config().enable_semantic_cache is True
+
+
+def test_configurable_bool_string():
+    config = Configuration.from_runnable_config(
+        {"configurable": {"enable_intent_clarify": "false"}}
+    )
+    assert config.enable_intent_clarify is False
+
+
+def test_memoized_per_configurable_values():
+    first = Configuration.from_runnable_config(
+        {"configurable": {"max_research_loops": 3, "thread_id": "a"}}
+    )
+    second = Configuration.from_runnable_config(
+        {"configurable": {"max_research_loops": 3, "thread_id": "b"}}
+    )
+    assert first is second
+
+
+def test_unhashable_configurable_value_falls_back():
+    configurable = {"query_generator_model": ["not", "hashable"]}
+    first = Configuration.from_runnable_config({"configurable": configurable})
+    second = Configuration.from_runnable_config({"configurable": configurable})
+    assert first.query_generator_model == ["not", "hashable"]
+    assert first == second
+    assert first is not second
+
+
+@pytest.mark.parametrize("value", ["ture", "enabled", "2"])
+def test_unrecognized_bool_string_is_rejected(monkeypatch, value):
+    monkeypatch.setenv("ENABLE_SEMANTIC_CACHE", value)
+    with pytest.raises(ValueError, match="enable_semantic_cache"):
+        Configuration.from_runnable_config()
+
+
+@pytest.mark.parametrize("value", ["auto", "web", "knowledge"])
+def test_force_search_mode_accepts_literal_values(value):
+    config = Configuration.from_runnable_config(
+        {"configurable": {"force_search_mode": value}}
+    )
+    assert config.force_search_mode == value
+
+
+def test_unknown_force_search_mode_is_rejected(monkeypatch):
+    monkeypatch.setenv("FORCE_SEARCH_MODE", "Web")
+    with pytest.raises(ValueError, match="force_search_mode"):
+        Configuration.from_runnable_config()
+
+
+def test_unknown_configurable_force_search_mode_is_rejected():
+    with pytest.raises(ValueError, match="force_search_mode"):
+        Configuration.from_runnable_config(
+            {"configurable": {"force_search_mode": "everything"}}
+        )
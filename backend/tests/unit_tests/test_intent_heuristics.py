@@ -0,0 +1,37 @@
+import pytest
+
+from agent.nodes import _heuristic_intent_clarity
+
+
+# Clear examples from intent_clarify_instructions
+@pytest.mark.parametrize(
+    "text", ["설정은 어떻게 해요?", "연동 방법 알려주세요", "요금제가 어떻게 돼요?"]
+)
+def test_explicit_question_is_clear(text):
+    assert _heuristic_intent_clarity(text, is_first_turn=True) is True
+
+
+# Inputs the prompt says need clarification, or that only the LLM can judge
+@pytest.mark.parametrize(
+    "text",
+    [
+        "이거 어떻게 해요?",
+        "이거 뭐예요 그럼?",
+        "그거 설정 방법 알려주세요",
+        "how do I fix this?",
+        "문제가 있어요",
+        "오류 해결해주세요",
+        "채널톡에서 메시지가 안 와요",
+    ],
+)
+def test_question_left_to_the_llm(text):
+    assert _heuristic_intent_clarity(text, is_first_turn=True) is None
+
+
+def test_too_short_first_turn_is_unclear():
+    assert _heuristic_intent_clarity("이거", is_first_turn=True) is False
+
+
+@pytest.mark.parametrize("text", ["예", "API", "요금"])
+def test_short_reply_in_conversation_is_left_to_the_llm(text):
+    assert _heuristic_intent_clarity(text, is_first_turn=False) is None
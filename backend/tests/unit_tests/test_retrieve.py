@@ -0,0 +1,52 @@
+import asyncio
+
+import numpy as np
+import orjson
+
+from agent.internal import retrieve
+
+
+class _Response:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def read(self):
+        return b'{"results": []}'
+
+
+class _Session:
+    def __init__(self):
+        self.payloads = []
+
+    def post(self, url, data, headers):
+        self.payloads.append(data)
+        return _Response()
+
+
+def test_query_to_vss_encodes_float16_vector(monkeypatch):
+    session = _Session()
+    monkeypatch.setattr(retrieve, "get_http_session", lambda: session)
+    vector = np.array([0.1, -0.5, 1.0], dtype=np.float16)
+
+    result = asyncio.run(retrieve.query_to_vss(vector, "요금제 안내", top_k=3))
+
+    assert result == {"results": []}
+    payload = orjson.loads(session.payloads[0])
+    np.testing.assert_array_equal(
+        np.asarray(payload["vector"], dtype=np.float32), vector.astype(np.float32)
+    )
+    assert payload["text"] == "요금제 안내"
+    assert payload["top_k"] == 3
+    assert payload["db_provider"] == "pinecone"
+
+
+def test_query_to_vss_encodes_list_vector(monkeypatch):
+    session = _Session()
+    monkeypatch.setattr(retrieve, "get_http_session", lambda: session)
+
+    asyncio.run(retrieve.query_to_vss([0.25, 0.5], "text"))
+
+    assert orjson.loads(session.payloads[0])["vector"] == [0.25, 0.5]
@@ -0,0 +1,114 @@
+from agent.utils import ShortUrlReplacer, join_summaries
+
+PREFIX = "https://vertexaisearch.cloud.google.com/id/"
+
+SOURCES = [
+    {"short_url": f"{PREFIX}0-0", "value": "https://example.com/a"},
+    {"short_url": f"{PREFIX}0-1", "value": "https://example.com/b"},
+    {"short_url": f"{PREFIX}0-10", "value": "https://example.com/k"},
+]
+
+
+def _stream(replacer, chunks):
+    return "".join(replacer.feed(chunk) for chunk in chunks) + replacer.flush()
+
+
+def test_short_url_split_across_chunks():
+    text = f"See [a]({PREFIX}0-0) for details."
+    for split in range(1, len(text)):
+        replacer = ShortUrlReplacer(SOURCES)
+        result = _stream(replacer, [text[:split], text[split:]])
+        assert result == "See [a](https://example.com/a) for details."
+
+
+def test_short_url_split_into_single_characters():
+    text = f"[k]({PREFIX}0-10) and [b]({PREFIX}0-1)"
+    replacer = ShortUrlReplacer(SOURCES)
+    assert _stream(replacer, list(text)) == (
+        "[k](https://example.com/k) and [b](https://example.com/b)"
+    )
+
+
+def test_repeated_short_url():
+    text = f"[a]({PREFIX}0-0) then [a]({PREFIX}0-0) again"
+    replacer = ShortUrlReplacer(SOURCES)
+    assert _stream(replacer, [text[:20], text[20:]]) == (
+        "[a](https://example.com/a) then [a](https://example.com/a) again"
+    )
+    assert replacer.cited_sources == [SOURCES[0]]
+
+
+def test_unknown_short_url_is_kept():
+    text = f"[x]({PREFIX}7-3)"
+    replacer = ShortUrlReplacer(SOURCES)
+    assert _stream(replacer, [text[:10], text[10:]]) == text
+    assert replacer.cited_sources == []
+
+
+def test_flush_returns_unterminated_tail():
+    replacer = ShortUrlReplacer(SOURCES)
+    streamed = replacer.feed(f"Ends with {PREFIX}0-")
+    assert replacer.flush() == f"Ends with {PREFIX}0-"[len(streamed) :]
+
+
+def test_flush_replaces_short_url_at_end_of_stream():
+    replacer = ShortUrlReplacer(SOURCES)
+    streamed = replacer.feed(f"Last: {PREFIX}0-1")
+    assert streamed + replacer.flush() == "Last: https://example.com/b"
+
+
+def test_cited_sources_follow_gathering_order():
+    text = f"[k]({PREFIX}0-10) [a]({PREFIX}0-0)"
+    replacer = ShortUrlReplacer(SOURCES)
+    _stream(replacer, [text])
+    assert replacer.cited_sources == [SOURCES[0], SOURCES[2]]
+
+
+def test_without_sources_text_passes_through():
+    replacer = ShortUrlReplacer([])
+    assert replacer.feed("plain") == "plain"
+    assert replacer.flush() == ""
+    assert replacer.cited_sources == []
+
+
+def test_join_summaries_under_budget():
+    assert join_summaries(["one", "two"], "\n---\n", 100) == "one\n---\ntwo"
+
+
+def test_join_summaries_exactly_at_budget():
+    joined = "one\n---\ntwo"
+    assert join_summaries(["one", "two"], "\n---\n", len(joined)) == joined
+
+
+def test_join_summaries_without_limit():
+    summaries = ["x" * 1000, "y" * 1000]
+    assert join_summaries(summaries, "\n", 0) == "\n".join(summaries)
+
+
+def test_join_summaries_single_oversized_summary():
+    summary = "\n".join(f"line {i}" for i in range(200))
+    result = join_summaries([summary], "\n---\n", 300)
+    assert len(result) <= 300
+    assert result.startswith("line 0\nline 1\n")
+    assert result.endswith("\n[...]")
+
+
+def test_join_summaries_shortens_only_the_largest():
+    short = "short summary"
+    long = "x" * 5000
+    result = join_summaries([short, long], "\n---\n", 1000)
+    assert len(result) <= 1000
+    assert result.startswith(short + "\n---\nxxx")
+
+
+def test_join_summaries_keeps_every_summary():
+    summaries = [f"summary {i}: " + "x" * 500 for i in range(5)]
+    result = join_summaries(summaries, "\n---\n", 1000)
+    assert len(result) <= 1000
+    assert result.count("\n---\n") == 4
+    for i in range(5):
+        assert f"summary {i}" in result
+
+
+def test_join_summaries_empty_list():
+    assert join_summaries([], "\n---\n", 100) == ""
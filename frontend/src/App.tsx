@@ -132,6 +132,12 @@ export default function App() {
           data: "Composing and presenting the final answer.",
         };
         hasFinalizeEventOccurredRef.current = true;
+      } else if (event.emit_draft) {
+        processedEvent = {
+          title: "Finalizing Answer",
+          data: "Presenting the answer drafted during reflection.",
+        };
+        hasFinalizeEventOccurredRef.current = true;
       } else if (event.finalize_knowledge_answer) {
         processedEvent = {
           title: "Finalizing Knowledge Answer",